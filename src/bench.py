@@ -0,0 +1,125 @@
+import argparse
+import json
+import platform
+import sys
+import time
+
+from src.engine import Game, Position
+from src.perft import REFERENCE_POSITIONS, perft
+
+
+# positions searched by the benchmark, the perft reference positions plus some quieter
+# middlegames and an endgame so the search sees a spread of position types
+BENCH_POSITIONS = [fen for fen, _ in REFERENCE_POSITIONS.values()] + [
+    "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4",
+    "r2q1rk1/pp2bppp/2n1pn2/3p4/3P4/2NBPN2/PP3PPP/R2Q1RK1 w - - 0 10",
+    "2r3k1/pp3ppp/4p3/3p4/3P4/4PN2/PP3PPP/2R3K1 w - - 0 20",
+    "8/5pk1/6p1/8/3K4/6P1/5P2/8 w - - 0 40",
+]
+
+# default depths, chosen so a run takes a few seconds but is long enough to time steadily
+DEFAULT_SEARCH_DEPTH = 5
+DEFAULT_PERFT_DEPTH = 3
+# static evaluations timed per position for the eval phase
+EVAL_REPEATS = 50000
+# percentage drop in nodes per second that counts as a regression
+DEFAULT_THRESHOLD = 5.0
+
+
+# runs the three benchmark phases and returns the results as a dict ready to be written as JSON.
+# The signature is the total search node count, which only changes when search behaviour does
+def run_bench(search_depth=DEFAULT_SEARCH_DEPTH,perft_depth=DEFAULT_PERFT_DEPTH):
+    positions = [Position.from_fen(fen) for fen in BENCH_POSITIONS]
+
+    # move generation, perft to a fixed depth from each position
+    start_time = time.perf_counter()
+    movegen_nodes = sum(perft(position,perft_depth) for position in positions)
+    movegen_seconds = time.perf_counter() - start_time
+
+    # evaluation, repeated static evaluations of each position
+    start_time = time.perf_counter()
+    for position in positions:
+        for _ in range(EVAL_REPEATS):
+            position.static_evaluate()
+    eval_seconds = time.perf_counter() - start_time
+    eval_calls = EVAL_REPEATS * len(positions)
+
+    # search, a fixed depth search with a fresh game (and empty tables) for each position
+    search_nodes = 0
+    search_seconds = 0.0
+    for fen in BENCH_POSITIONS:
+        game = Game()
+        game.set_position(Position.from_fen(fen))
+        start_time = time.perf_counter()
+        for depth in range(1, search_depth + 1):
+            game.search_to_depth(game.position,depth)
+        search_seconds += time.perf_counter() - start_time
+        search_nodes += game.nodes
+
+    return {
+        "python": platform.python_version(),
+        "search_depth": search_depth,
+        "perft_depth": perft_depth,
+        "signature": search_nodes,
+        "phases": {
+            "movegen": _phase(movegen_nodes,movegen_seconds),
+            "eval": _phase(eval_calls,eval_seconds),
+            "search": _phase(search_nodes,search_seconds),
+        },
+        "total_nodes": movegen_nodes + search_nodes,
+        "total_seconds": round(movegen_seconds + eval_seconds + search_seconds, 3),
+    }
+
+# result for one phase, nodes per second is calls per second for the eval phase
+def _phase(nodes,seconds):
+    return {"nodes": nodes, "seconds": round(seconds, 3), "nps": int(nodes / seconds) if seconds > 0 else 0}
+
+# compares results with a baseline, returns a list of problems. A phase has regressed if its
+# nodes per second dropped by more than threshold percent, and a changed signature means the
+# search now visits different nodes
+def compare_results(results,baseline,threshold=DEFAULT_THRESHOLD):
+    problems = []
+    if (results["search_depth"], results["perft_depth"]) != (baseline["search_depth"], baseline["perft_depth"]):
+        problems.append("baseline was run with different settings")
+        return problems
+    if results["signature"] != baseline["signature"]:
+        problems.append(f"signature changed from {baseline['signature']} to {results['signature']}")
+    for name, phase in results["phases"].items():
+        old_nps = baseline["phases"][name]["nps"]
+        if old_nps and phase["nps"] < old_nps * (1 - threshold / 100):
+            drop = (old_nps - phase["nps"]) / old_nps * 100
+            problems.append(f"{name} nps dropped {drop:.1f}% ({old_nps} -> {phase['nps']})")
+    return problems
+
+
+# command line tool, e.g. python -m src.bench --output bench.json --baseline old.json
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks move generation, evaluation and search")
+    parser.add_argument("--depth",type=int,default=DEFAULT_SEARCH_DEPTH,help="search depth")
+    parser.add_argument("--perft-depth",type=int,default=DEFAULT_PERFT_DEPTH)
+    parser.add_argument("--output",help="file to write the JSON results to")
+    parser.add_argument("--baseline",help="JSON results from an earlier run to compare against")
+    parser.add_argument("--threshold",type=float,default=DEFAULT_THRESHOLD,
+                        help="percentage nps drop that counts as a regression")
+    args = parser.parse_args()
+
+    results = run_bench(args.depth,args.perft_depth)
+    for name, phase in results["phases"].items():
+        print(f"{name:8} {phase['nodes']:>10} nodes {phase['seconds']:>8.3f}s {phase['nps']:>10} nps")
+    print(f"total nodes {results['total_nodes']} in {results['total_seconds']}s, signature {results['signature']}")
+
+    if args.output:
+        with open(args.output,"w") as file:
+            json.dump(results,file,indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            problems = compare_results(results,json.load(file),args.threshold)
+        for problem in problems:
+            print("REGRESSION: " + problem, file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+# runs our main function
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,208 @@
+import argparse
+import heapq
+import os
+import struct
+import tempfile
+import time
+from multiprocessing import Pool
+
+from src.book import POLYGLOT_ENTRY, polyglot_key, encode_polyglot_move
+from src.pgn import read_games, replay_game
+
+
+# records in the sorted run files: Polyglot key, Polyglot move, then wins, draws and losses
+# for the side that played the move
+RUN_RECORD = struct.Struct(">QHIII")
+# games replayed by one task before its counts are written out as a sorted run
+DEFAULT_GAMES_PER_RUN = 2000
+# most run files merged at once, larger merges are done in several passes
+MERGE_FAN_IN = 64
+# plies of each game added to the book
+DEFAULT_PLIES = 20
+# moves seen in fewer games than this are left out of the book
+DEFAULT_MIN_GAMES = 2
+# largest weight a Polyglot entry can hold
+MAX_WEIGHT = 0xFFFF
+# win/draw/loss counter index for the side to move, by game result and whether white is to move
+RESULT_INDEX = {("1-0", True): 0, ("1-0", False): 2,
+                ("0-1", True): 2, ("0-1", False): 0,
+                ("1/2-1/2", True): 1, ("1/2-1/2", False): 1}
+
+
+# replays the opening of each game in a batch and writes the (key, move) counts to a sorted run
+# file in run_dir, returning its path and the number of games used. A move counts once per game
+# however often it is repeated in it, so the counts are numbers of games. Games without a result
+# or with an illegal move are skipped
+def count_games(games,run_dir,max_plies):
+    counts = {}
+    used_games = 0
+    for headers, movetext in games:
+        result = headers.get("Result")
+        if result not in ("1-0", "0-1", "1/2-1/2"):
+            continue
+        game_moves = set()
+        try:
+            for position, move in replay_game(headers,movetext,max_plies):
+                key = (polyglot_key(position),encode_polyglot_move(position,move))
+                game_moves.add((key, RESULT_INDEX[result, position.is_whites_move]))
+        except ValueError:
+            continue
+        used_games += 1
+        for key, index in game_moves:
+            totals = counts.get(key)
+            if totals is None:
+                totals = counts[key] = [0, 0, 0]
+            totals[index] += 1
+
+    file_descriptor, path = tempfile.mkstemp(suffix=".run",dir=run_dir)
+    with os.fdopen(file_descriptor,"wb") as file:
+        for (key, move), (wins, draws, losses) in sorted(counts.items()):
+            file.write(RUN_RECORD.pack(key,move,wins,draws,losses))
+    return path, used_games
+
+# worker entry point for the process pool
+def _count_games_job(job):
+    return count_games(*job)
+
+# reads the records of a run file in order
+def read_run(path):
+    with open(path,"rb") as file:
+        while True:
+            chunk = file.read(RUN_RECORD.size * 4096)
+            if not chunk:
+                break
+            yield from RUN_RECORD.iter_unpack(chunk)
+
+# merges sorted runs into one stream, adding up the counts for the same (key, move)
+def merge_runs(paths):
+    current = None
+    for key, move, wins, draws, losses in heapq.merge(*(read_run(path) for path in paths)):
+        if current is not None and current[0] == key and current[1] == move:
+            current[2] += wins
+            current[3] += draws
+            current[4] += losses
+        else:
+            if current is not None:
+                yield tuple(current)
+            current = [key, move, wins, draws, losses]
+    if current is not None:
+        yield tuple(current)
+
+# merges runs MERGE_FAN_IN at a time until few enough are left to merge in one go, so the
+# number of open files stays bounded
+def reduce_runs(paths,run_dir):
+    while len(paths) > MERGE_FAN_IN:
+        merged_paths = []
+        for start in range(0, len(paths), MERGE_FAN_IN):
+            group = paths[start:start + MERGE_FAN_IN]
+            file_descriptor, path = tempfile.mkstemp(suffix=".run",dir=run_dir)
+            with os.fdopen(file_descriptor,"wb") as file:
+                for record in merge_runs(group):
+                    file.write(RUN_RECORD.pack(*record))
+            for old_path in group:
+                os.remove(old_path)
+            merged_paths.append(path)
+        paths = merged_paths
+    return paths
+
+# writes Polyglot entries from the merged records. Each move's weight is two per win plus one
+# per draw, and a position's weights are scaled down together if any would overflow
+def write_book(records,output_path,min_games):
+    entry_count = 0
+    with open(output_path,"wb") as file:
+        position_entries = []
+        for record in records:
+            if position_entries and position_entries[0][0] != record[0]:
+                entry_count += _write_position(file,position_entries,min_games)
+                position_entries = []
+            position_entries.append(record)
+        if position_entries:
+            entry_count += _write_position(file,position_entries,min_games)
+    return entry_count
+
+# writes the entries for one position, returns how many were written
+def _write_position(file,records,min_games):
+    entries = [(key, move, 2 * wins + draws) for key, move, wins, draws, losses in records
+               if wins + draws + losses >= min_games]
+    if not entries:
+        return 0
+    largest = max(weight for _, _, weight in entries)
+    scale = MAX_WEIGHT / largest if largest > MAX_WEIGHT else 1
+    for key, move, weight in entries:
+        file.write(POLYGLOT_ENTRY.pack(key,move,int(weight * scale),0))
+    return len(entries)
+
+# splits a stream of games into lists of games_per_run
+def batch_games(games,games_per_run):
+    batch = []
+    for game in games:
+        batch.append(game)
+        if len(batch) == games_per_run:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# streams games from PGN files into a Polyglot book. Batches of games are counted by a pool of
+# processes, each writing a sorted run file, and the runs are merged from disk, so memory use
+# depends on the batch size and not on the size of the corpus. Returns (games, entries)
+def build_book(pgn_paths,output_path,max_plies=DEFAULT_PLIES,min_games=DEFAULT_MIN_GAMES,
+               processes=1,games_per_run=DEFAULT_GAMES_PER_RUN):
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    with tempfile.TemporaryDirectory(dir=output_dir) as run_dir:
+        def games():
+            for pgn_path in pgn_paths:
+                with open(pgn_path,encoding="utf-8",errors="replace") as file:
+                    yield from read_games(file)
+        jobs = ((batch,run_dir,max_plies) for batch in batch_games(games(),games_per_run))
+
+        run_paths = []
+        game_count = 0
+        if processes > 1:
+            # keeps only a few batches waiting at a time, so reading can't run ahead of counting
+            with Pool(processes) as pool:
+                pending = []
+                for job in jobs:
+                    pending.append(pool.apply_async(_count_games_job,(job,)))
+                    if len(pending) >= 2 * processes:
+                        path, used_games = pending.pop(0).get()
+                        run_paths.append(path)
+                        game_count += used_games
+                for result in pending:
+                    path, used_games = result.get()
+                    run_paths.append(path)
+                    game_count += used_games
+        else:
+            for job in jobs:
+                path, used_games = count_games(*job)
+                run_paths.append(path)
+                game_count += used_games
+
+        run_paths = reduce_runs(run_paths,run_dir)
+        entry_count = write_book(merge_runs(run_paths),output_path,min_games)
+    return game_count, entry_count
+
+
+# command line tool, e.g. python -m src.book_builder games.pgn -o data/book.bin
+def main():
+    parser = argparse.ArgumentParser(description="Builds a Polyglot opening book from PGN files")
+    parser.add_argument("pgn",nargs="+",help="PGN files to read")
+    parser.add_argument("-o","--output",default=os.path.join("data","book.bin"))
+    parser.add_argument("--plies",type=int,default=DEFAULT_PLIES,help="moves from each game to add")
+    parser.add_argument("--min-games",type=int,default=DEFAULT_MIN_GAMES,
+                        help="games a move must be played in to be kept")
+    parser.add_argument("--processes",type=int,default=os.cpu_count() or 1)
+    parser.add_argument("--games-per-run",type=int,default=DEFAULT_GAMES_PER_RUN,
+                        help="games counted in memory before being written to disk")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    game_count, entry_count = build_book(args.pgn,args.output,args.plies,args.min_games,
+                                         args.processes,args.games_per_run)
+    print(f"{game_count} games, {entry_count} entries written to {args.output} "
+          f"in {time.perf_counter() - start_time:.1f}s")
+
+
+# runs our main function
+if __name__ == "__main__":
+    main()
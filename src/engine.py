@@ -1,3 +1,13 @@
+import multiprocessing
+import os
+import queue
+import random
+import time
+from array import array
+from multiprocessing import shared_memory
+from operator import itemgetter
+
+
 # stores values when summing up pieces
 piece_values = {'p':100,
                 'n':300,
@@ -7,11 +17,225 @@ piece_values = {'p':100,
                 }
 
 
+# Piece-square tables
+# --------------------------------------------------------------
+# Bonuses in centipawns for a piece standing on a square, written from white's point of view
+# with row 0 (black's back rank) first, the same way round as Position.board. Each piece has a
+# midgame and an endgame table, which are blended by how much material is left on the board
+_pawn_midgame = [
+      0,  0,  0,  0,  0,  0,  0,  0,
+     50, 50, 50, 50, 50, 50, 50, 50,
+     10, 10, 20, 30, 30, 20, 10, 10,
+      5,  5, 10, 25, 25, 10,  5,  5,
+      0,  0,  0, 20, 20,  0,  0,  0,
+      5, -5,-10,  0,  0,-10, -5,  5,
+      5, 10, 10,-20,-20, 10, 10,  5,
+      0,  0,  0,  0,  0,  0,  0,  0]
+_pawn_endgame = [
+      0,  0,  0,  0,  0,  0,  0,  0,
+     80, 80, 80, 80, 80, 80, 80, 80,
+     50, 50, 50, 50, 50, 50, 50, 50,
+     30, 30, 30, 30, 30, 30, 30, 30,
+     15, 15, 15, 15, 15, 15, 15, 15,
+      5,  5,  5,  5,  5,  5,  5,  5,
+      0,  0,  0,  0,  0,  0,  0,  0,
+      0,  0,  0,  0,  0,  0,  0,  0]
+_knight_table = [
+    -50,-40,-30,-30,-30,-30,-40,-50,
+    -40,-20,  0,  0,  0,  0,-20,-40,
+    -30,  0, 10, 15, 15, 10,  0,-30,
+    -30,  5, 15, 20, 20, 15,  5,-30,
+    -30,  0, 15, 20, 20, 15,  0,-30,
+    -30,  5, 10, 15, 15, 10,  5,-30,
+    -40,-20,  0,  5,  5,  0,-20,-40,
+    -50,-40,-30,-30,-30,-30,-40,-50]
+_bishop_table = [
+    -20,-10,-10,-10,-10,-10,-10,-20,
+    -10,  0,  0,  0,  0,  0,  0,-10,
+    -10,  0,  5, 10, 10,  5,  0,-10,
+    -10,  5,  5, 10, 10,  5,  5,-10,
+    -10,  0, 10, 10, 10, 10,  0,-10,
+    -10, 10, 10, 10, 10, 10, 10,-10,
+    -10,  5,  0,  0,  0,  0,  5,-10,
+    -20,-10,-10,-10,-10,-10,-10,-20]
+_rook_table = [
+      0,  0,  0,  0,  0,  0,  0,  0,
+      5, 10, 10, 10, 10, 10, 10,  5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+      0,  0,  0,  5,  5,  0,  0,  0]
+_queen_table = [
+    -20,-10,-10, -5, -5,-10,-10,-20,
+    -10,  0,  0,  0,  0,  0,  0,-10,
+    -10,  0,  5,  5,  5,  5,  0,-10,
+     -5,  0,  5,  5,  5,  5,  0, -5,
+      0,  0,  5,  5,  5,  5,  0, -5,
+    -10,  5,  5,  5,  5,  5,  0,-10,
+    -10,  0,  5,  0,  0,  0,  0,-10,
+    -20,-10,-10, -5, -5,-10,-10,-20]
+_king_midgame = [
+    -30,-40,-40,-50,-50,-40,-40,-30,
+    -30,-40,-40,-50,-50,-40,-40,-30,
+    -30,-40,-40,-50,-50,-40,-40,-30,
+    -30,-40,-40,-50,-50,-40,-40,-30,
+    -20,-30,-30,-40,-40,-30,-30,-20,
+    -10,-20,-20,-20,-20,-20,-20,-10,
+     20, 20,  0,  0,  0,  0, 20, 20,
+     20, 30, 10,  0,  0, 10, 30, 20]
+_king_endgame = [
+    -50,-40,-30,-20,-20,-30,-40,-50,
+    -30,-20,-10,  0,  0,-10,-20,-30,
+    -30,-10, 20, 30, 30, 20,-10,-30,
+    -30,-10, 30, 40, 40, 30,-10,-30,
+    -30,-10, 30, 40, 40, 30,-10,-30,
+    -30,-10, 20, 30, 30, 20,-10,-30,
+    -30,-30,  0,  0,  0,  0,-30,-30,
+    -50,-30,-30,-30,-30,-30,-30,-50]
+
+# (midgame, endgame) tables for each piece type
+PIECE_SQUARE_TABLES = {'p': (_pawn_midgame,_pawn_endgame),
+                       'n': (_knight_table,_knight_table),
+                       'b': (_bishop_table,_bishop_table),
+                       'r': (_rook_table,_rook_table),
+                       'q': (_queen_table,_queen_table),
+                       'k': (_king_midgame,_king_endgame)}
+
+# how much each piece counts towards the game phase, 24 is the full starting material
+PHASE_WEIGHTS = {'p':0,'n':1,'b':1,'r':2,'q':4,'k':0}
+TOTAL_PHASE = 24
+
+# material plus square bonus for each piece letter on each square index, positive for white
+# and negative for black (black pieces read the tables upside down)
+MIDGAME_VALUES = {}
+ENDGAME_VALUES = {}
+PHASE_VALUES = {}
+for _piece in 'PNBRQKpnbrqk':
+    _kind = _piece.lower()
+    _material = piece_values.get(_kind,0)
+    _midgame_table, _endgame_table = PIECE_SQUARE_TABLES[_kind]
+    if _piece.isupper():
+        MIDGAME_VALUES[_piece] = [_material + _midgame_table[_index] for _index in range(64)]
+        ENDGAME_VALUES[_piece] = [_material + _endgame_table[_index] for _index in range(64)]
+    else:
+        _mirrored = [(7 - _index // 8)*8 + _index % 8 for _index in range(64)]
+        MIDGAME_VALUES[_piece] = [-_material - _midgame_table[_mirrored[_index]] for _index in range(64)]
+        ENDGAME_VALUES[_piece] = [-_material - _endgame_table[_mirrored[_index]] for _index in range(64)]
+    PHASE_VALUES[_piece] = PHASE_WEIGHTS[_kind]
+
+
+# Precomputed move tables
+# --------------------------------------------------------------
+# Built once at import so move generation and attack detection never rebuild direction lists
+# or check for the edge of the board. Tables are indexed [row][col]
+
+ROOK_DIRECTIONS = [(1,0),(-1,0),(0,1),(0,-1)]
+BISHOP_DIRECTIONS = [(1,1),(-1,1),(-1,-1),(1,-1)]
+KNIGHT_DIRECTIONS = [(1,2),(1,-2),(-1,2),(-1,-2),(2,1),(2,-1),(-2,1),(-2,-1)]
+KING_DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+# builds the list of on-board squares reached by single steps from each square
+def _build_step_table(directions):
+    table = []
+    for row in range(8):
+        table_row = []
+        for col in range(8):
+            targets = []
+            for row_direction, col_direction in directions:
+                check_row = row + row_direction
+                check_col = col + col_direction
+                if 0 <= check_row <= 7 and 0 <= check_col <= 7:
+                    targets.append((check_row,check_col))
+            table_row.append(targets)
+        table.append(table_row)
+    return table
+
+# builds the ordered list of squares along a direction from each square, nearest first
+def _build_ray_table(direction):
+    row_direction, col_direction = direction
+    table = []
+    for row in range(8):
+        table_row = []
+        for col in range(8):
+            ray = []
+            check_row = row + row_direction
+            check_col = col + col_direction
+            while 0 <= check_row <= 7 and 0 <= check_col <= 7:
+                ray.append((check_row,check_col))
+                check_row += row_direction
+                check_col += col_direction
+            table_row.append(ray)
+        table.append(table_row)
+    return table
+
+KNIGHT_TARGETS = _build_step_table(KNIGHT_DIRECTIONS)
+KING_TARGETS = _build_step_table(KING_DIRECTIONS)
+# squares attacked by a pawn standing on each square, indexed by is_white
+PAWN_ATTACKS = {True: _build_step_table([(-1,1),(-1,-1)]),
+                False: _build_step_table([(1,1),(1,-1)])}
+# ray for every direction from every square
+RAY_TABLES = {direction: _build_ray_table(direction) for direction in KING_DIRECTIONS}
+# non-empty rays grouped by slider type, ROOK_RAY_TABLE[row][col] is a list of rays
+ROOK_RAY_TABLE = [[[RAY_TABLES[direction][row][col] for direction in ROOK_DIRECTIONS
+                    if RAY_TABLES[direction][row][col]] for col in range(8)] for row in range(8)]
+BISHOP_RAY_TABLE = [[[RAY_TABLES[direction][row][col] for direction in BISHOP_DIRECTIONS
+                      if RAY_TABLES[direction][row][col]] for col in range(8)] for row in range(8)]
+QUEEN_RAY_TABLE = [[ROOK_RAY_TABLE[row][col] + BISHOP_RAY_TABLE[row][col] for col in range(8)] for row in range(8)]
+
+
+# Square indices
+# --------------------------------------------------------------
+# Squares are indexed 0-63 as row*8 + col, so index 0 is a8 (top left of the board as stored
+# in Position.board) and index 63 is h1
+
+# converts between (row,col) squares and indices
+SQUARES = [(index // 8, index % 8) for index in range(64)]
+
+def square_index(square):
+    row, col = square
+    return row*8 + col
+
+
+# Zobrist hashing
+# --------------------------------------------------------------
+# Each feature of a position gets a random 64-bit key and a position's hash is the XOR of the
+# keys of every feature present, so a move only has to XOR the features it changes. A fixed seed
+# keeps hashes the same between runs
+_zobrist_random = random.Random(20240101)
+
+# keys for each piece letter on each square index
+ZOBRIST_PIECE_KEYS = {piece: [_zobrist_random.getrandbits(64) for _ in range(64)] for piece in 'PNBRQKpnbrqk'}
+# key XORed in when it is black's move
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+# one key per castling right, combined into a key for every combination of the four flags
+_castling_right_keys = [_zobrist_random.getrandbits(64) for _ in range(4)]
+ZOBRIST_CASTLING_KEYS = []
+for _flags in range(16):
+    _key = 0
+    for _bit in range(4):
+        if _flags >> _bit & 1:
+            _key ^= _castling_right_keys[_bit]
+    ZOBRIST_CASTLING_KEYS.append(_key)
+# keys for the column of the en passant target square
+ZOBRIST_EN_PASSANT_KEYS = [_zobrist_random.getrandbits(64) for _ in range(8)]
+
+# gets the key for a set of castling flags
+def castling_key(K_cq,K_ck,k_cq,k_ck):
+    return ZOBRIST_CASTLING_KEYS[K_cq | K_ck << 1 | k_cq << 2 | k_ck << 3]
+
+
 # class for storing all important info in a position, and methods that purely access a position
 class Position:
+    # fixed attributes keep each position small, as many are alive at once during search
+    __slots__ = ('board','is_whites_move','K_position','k_position','K_cq','K_ck','k_cq','k_ck',
+                 'en_passant_target','legal_moves','half_move_clock','zobrist_hash',
+                 'midgame_score','endgame_score','phase','pieces')
+
     def __init__(self,board,is_whites_move=True,K_position=(7,4),k_position=(0,4),
                  K_cq=True,K_ck=True,k_cq=True,k_ck=True,en_passant_target=None,
-                 legal_moves=None,half_move_clock=0):
+                 legal_moves=None,half_move_clock=0,zobrist_hash=None,eval_state=None):
         self.board = board
         self.is_whites_move = is_whites_move
         self.K_position = K_position
@@ -21,8 +245,15 @@ class Position:
         self.k_cq = k_cq # Black king can castle queenside
         self.k_ck = k_ck # Black king can castle kingside
         self.en_passant_target = en_passant_target # Potential square that can be moved to by en passant, None if not possible
-        self.legal_moves = legal_moves # caches legal moves in a position
+        self.legal_moves = legal_moves # caches legal moves in a position, as encoded moves
         self.half_move_clock = half_move_clock
+        # 64-bit hash of the position, updated incrementally as moves are made
+        self.zobrist_hash = self._compute_hash() if zobrist_hash is None else zobrist_hash
+        # midgame score, endgame score and game phase, updated incrementally as pieces move
+        self.midgame_score, self.endgame_score, self.phase = (
+            self._compute_eval_state() if eval_state is None else eval_state)
+        # pieces on the board including kings, updated as pieces are added and removed
+        self.pieces = 64 - sum(row.count(None) for row in board)
     
     # Gets piece at a given board sqaure
     def get_piece_at(self,square):
@@ -47,18 +278,113 @@ class Position:
             k_ck=self.k_ck,
             en_passant_target=self.en_passant_target,
             legal_moves=None,
-            half_move_clock=self.half_move_clock
+            half_move_clock=self.half_move_clock,
+            zobrist_hash=self.zobrist_hash,
+            eval_state=(self.midgame_score,self.endgame_score,self.phase)
         )
     
+
+    # creates a position from a FEN string, the full move number is ignored
+    @classmethod
+    def from_fen(cls,fen):
+        # placement, side to move and castling are needed, the other fields have defaults
+        fields = fen.split()
+        if len(fields) < 3:
+            raise ValueError(f"FEN needs at least placement, side to move and castling fields: {fen}")
+        placement, side, castling = fields[0], fields[1], fields[2]
+        en_passant = fields[3] if len(fields) > 3 else '-'
+        half_move_clock = int(fields[4]) if len(fields) > 4 else 0
+
+        # fills in the board rank by rank from black's back rank, digits are runs of empty squares
+        board = []
+        for rank in placement.split('/'):
+            row = []
+            for char in rank:
+                if char.isdigit():
+                    row.extend([None] * int(char))
+                else:
+                    row.append(char)
+            board.append(row)
+        if len(board) != 8 or any(len(row) != 8 for row in board):
+            raise ValueError(f"invalid FEN placement: {placement}")
+
+        K_position = k_position = None
+        for row in range(8):
+            for col in range(8):
+                if board[row][col] == 'K':
+                    K_position = (row,col)
+                elif board[row][col] == 'k':
+                    k_position = (row,col)
+        if K_position is None or k_position is None:
+            raise ValueError(f"FEN must have one king for each side: {placement}")
+
+        return cls(board,
+                   is_whites_move=side == 'w',
+                   K_position=K_position,
+                   k_position=k_position,
+                   K_cq='Q' in castling,
+                   K_ck='K' in castling,
+                   k_cq='q' in castling,
+                   k_ck='k' in castling,
+                   en_passant_target=None if en_passant == '-' else parse_square(en_passant),
+                   half_move_clock=half_move_clock)
+
+    # gets the FEN string for the position. Positions don't track the full move number so it
+    # has to be passed in
+    def to_fen(self,full_move_number=1):
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for piece in row:
+                if piece:
+                    rank += (str(empty) if empty else "") + piece
+                    empty = 0
+                else:
+                    empty += 1
+            ranks.append(rank + (str(empty) if empty else ""))
+        castling = "".join(flag for flag, allowed in
+                           (("K",self.K_ck),("Q",self.K_cq),("k",self.k_ck),("q",self.k_cq)) if allowed)
+        en_passant = square_name(self.en_passant_target) if self.en_passant_target else "-"
+        return (f"{'/'.join(ranks)} {'w' if self.is_whites_move else 'b'} {castling or '-'} "
+                f"{en_passant} {self.half_move_clock} {full_move_number}")
+
+    # counts the pieces on the board, including kings
+    def piece_count(self):
+        return self.pieces
+
     # Returns new position with move applied (presumed legal)
     def after_move(self,start_sqr,end_sqr,promoting_piece='q'):
         # creates a copy of the position we can modify
         new_position = self.get_position_copy()
+        _, new_position_definitely_reached = new_position.make_move(start_sqr,end_sqr,promoting_piece)
+        return [new_position,new_position_definitely_reached]
+
+    # Applies an encoded move to this position in place, as make_move
+    def make_encoded_move(self,code):
+        return self.make_move(SQUARES[code & 63],SQUARES[code >> 6 & 63],
+                              PROMOTION_PIECES[code >> 12 & 3] if code & PROMOTION_FLAG else 'q')
+
+    # Applies a move to this position in place (presumed legal). Returns an undo record for
+    # unmake_move, and a flag that is true if no previous positions can be reached again
+    def make_move(self,start_sqr,end_sqr,promoting_piece='q'):
         # gets our pieces that will be involved in the move
         piece = self.get_piece_at(start_sqr)
         taken_square = self.get_piece_at(end_sqr)
 
-        # creates a flag that will be returned when after move is called, it returns true if
+        # stores everything the move can change that can't be worked out from the move itself
+        undo = (start_sqr,end_sqr,piece,taken_square,
+                self.K_cq,self.K_ck,self.k_cq,self.k_ck,
+                self.en_passant_target,self.half_move_clock,
+                self.K_position,self.k_position,self.legal_moves,self.zobrist_hash)
+
+        # removes the castling and en passant keys from the hash, they are added back once the
+        # move has updated them (piece keys are handled by _update_square)
+        self.zobrist_hash ^= castling_key(self.K_cq,self.K_ck,self.k_cq,self.k_ck)
+        if self.en_passant_target:
+            self.zobrist_hash ^= ZOBRIST_EN_PASSANT_KEYS[self.en_passant_target[1]]
+
+        # creates a flag that will be returned when the move is made, it returns true if
         # a move has been made such that no previous positions can be reached again. This is
         # used in threefold repetition detection
         new_position_definitely_reached = False
@@ -68,63 +394,63 @@ class Position:
             # updates special repetition flag
             new_position_definitely_reached = True
             # updates half move clock to zero
-            new_position.half_move_clock = 0
+            self.half_move_clock = 0
             # unpacks square info
             start_row, start_col = start_sqr
             end_row, end_col = end_sqr
             # if we have a two square pawn move, updates en_passant_target
             if abs(start_row-end_row) == 2:
                 forward_dir = 1 if piece == 'p' else -1
-                new_position.en_passant_target = (start_row+forward_dir,start_col)
+                self.en_passant_target = (start_row+forward_dir,start_col)
             # makes en passant target None
             else:
-                new_position.en_passant_target = None
-                # Removes taken en passant pawn from board, note that it uses old en_passant target as new one 
-                # has already been updated
+                # Removes taken en passant pawn from board, note that it checks the old en_passant target
+                # before it is cleared
                 if end_sqr == self.en_passant_target:
-                    new_position._update_square((start_row,end_col),None)
+                    self._update_square((start_row,end_col),None)
                 # handles promotion by black
                 elif end_row == 7:
                     piece = promoting_piece.lower()
                 # handles promotion by white
                 elif end_row == 0:
                     piece = promoting_piece.upper()
+                self.en_passant_target = None
 
         # runs when we don't have a pawn move
         else: 
             # runs if our move is a capture
             if taken_square:
                 # updates half move count
-                new_position.half_move_clock = 0
+                self.half_move_clock = 0
                 # update special repition flag
                 new_position_definitely_reached = True
             # runs if no capture
             else:
                 # updates half move count
-                new_position.half_move_clock += 1
+                self.half_move_clock += 1
             # updates en passant target
-            new_position.en_passant_target = None
+            self.en_passant_target = None
             
             # updates castling flags for rook moves
             # runs if black rook moves
             if piece == 'r':
                 # runs if black king can castle kingside and we have kingside castling rook
                 if self.k_ck and start_sqr == (0,7):
-                    new_position.k_ck = False
+                    self.k_ck = False
                     new_position_definitely_reached = True
                 # run if black king can castle queenside and we have queenside castling rook
                 elif self.k_cq and start_sqr == (0,0):
-                    new_position.k_cq = False
+                    self.k_cq = False
                     new_position_definitely_reached = True
             # runs if white rook moves
             elif piece == 'R':
                 # runs if white king can castle kingside and we have kingside castling rook
                 if self.K_ck and start_sqr == (7,7):
-                    new_position.K_ck = False
+                    self.K_ck = False
                     new_position_definitely_reached = True
                 # runs if white king can castle queenside and we have queenside castling rook
                 elif self.K_cq and start_sqr == (7,0):
-                    new_position.K_cq = False
+                    self.K_cq = False
                     new_position_definitely_reached = True
 
             # runs if we have a king move, handles castling
@@ -133,62 +459,124 @@ class Position:
                 end_col = end_sqr[1]
                 # if king castles queenside updates rook position
                 if start_col - end_col == 2:
-                    rook = new_position.get_piece_at((start_row,0))
-                    new_position._update_square((start_row,0),None)
-                    new_position._update_square((start_row,end_col+1),rook)
+                    rook = self.get_piece_at((start_row,0))
+                    self._update_square((start_row,0),None)
+                    self._update_square((start_row,end_col+1),rook)
                 # if king castles kingside updates rook position
                 elif start_col - end_col == -2:
-                    rook = new_position.get_piece_at((start_row,7))
-                    new_position._update_square((start_row,7),None)
-                    new_position._update_square((start_row,end_col-1),rook)
+                    rook = self.get_piece_at((start_row,7))
+                    self._update_square((start_row,7),None)
+                    self._update_square((start_row,end_col-1),rook)
 
                 # updates castling flags
                 # runs if black king moves
                 if piece == 'k':
-                    new_position.k_position = end_sqr
+                    self.k_position = end_sqr
                     if self.k_ck:
-                        new_position.k_ck = False
+                        self.k_ck = False
                         new_position_definitely_reached = True
                     if self.k_cq:
-                        new_position.k_cq = False
+                        self.k_cq = False
                         new_position_definitely_reached = True
                 # runs if white king moves
                 else:
-                    new_position.K_position = end_sqr
+                    self.K_position = end_sqr
                     if self.K_ck:
-                        new_position.K_ck = False
+                        self.K_ck = False
                         new_position_definitely_reached = True
                     if self.K_cq:
-                        new_position.K_cq = False
+                        self.K_cq = False
                         new_position_definitely_reached = True
   
         
         # updates castling rights if we have a rook capture
         if taken_square and taken_square.lower() == 'r': # if taken_piece stops crash when we have an empty square
             if self.k_ck and end_sqr == (0,7):
-                new_position.k_ck = False
+                self.k_ck = False
                 new_position_definitely_reached = True
             elif self.k_cq and end_sqr == (0,0):
-                new_position.k_cq = False
+                self.k_cq = False
                 new_position_definitely_reached = True
             elif self.K_ck and end_sqr == (7,7):
-                new_position.K_ck = False
+                self.K_ck = False
                 new_position_definitely_reached = True
             elif self.K_cq and end_sqr == (7,0):
-                new_position.K_cq = False
+                self.K_cq = False
                 new_position_definitely_reached = True
 
 
         # updates moving piece position
-        new_position._update_square(end_sqr,piece)
-        new_position._update_square(start_sqr,None)
+        self._update_square(end_sqr,piece)
+        self._update_square(start_sqr,None)
         
         # Updates move status
-        new_position.is_whites_move = not self.is_whites_move
-        # Updates legal moves cache
-        new_position.legal_moves = None
+        self.is_whites_move = not self.is_whites_move
+        # Clears legal moves cache, the old moves are kept in the undo record
+        self.legal_moves = None
+
+        # adds the new castling, en passant and side to move keys to the hash
+        self.zobrist_hash ^= castling_key(self.K_cq,self.K_ck,self.k_cq,self.k_ck) ^ ZOBRIST_BLACK_TO_MOVE
+        if self.en_passant_target:
+            self.zobrist_hash ^= ZOBRIST_EN_PASSANT_KEYS[self.en_passant_target[1]]
         
-        return [new_position,new_position_definitely_reached]
+        return undo, new_position_definitely_reached
+
+    # Reverses a move made with make_move using its undo record
+    def unmake_move(self,undo):
+        (start_sqr,end_sqr,piece,taken_square,
+         self.K_cq,self.K_ck,self.k_cq,self.k_ck,
+         self.en_passant_target,self.half_move_clock,
+         self.K_position,self.k_position,self.legal_moves,zobrist_hash) = undo
+
+        # puts moving piece back (as a pawn if it promoted) and restores any captured piece
+        self._update_square(start_sqr,piece)
+        self._update_square(end_sqr,taken_square)
+
+        # runs if we have undone a pawn move
+        if piece in ('p','P'):
+            # puts back pawn taken en passant
+            if end_sqr == self.en_passant_target:
+                self._update_square((start_sqr[0],end_sqr[1]),'P' if piece == 'p' else 'p')
+        # runs if we have undone a castle, puts the rook back in the corner
+        elif piece in ('k','K') and abs(start_sqr[1] - end_sqr[1]) == 2:
+            row = start_sqr[0]
+            rook_col = end_sqr[1] + 1 if end_sqr[1] < start_sqr[1] else end_sqr[1] - 1
+            corner_col = 0 if end_sqr[1] < start_sqr[1] else 7
+            self._update_square((row,corner_col),self.get_piece_at((row,rook_col)))
+            self._update_square((row,rook_col),None)
+
+        # Updates move status
+        self.is_whites_move = not self.is_whites_move
+        # restores the hash directly rather than undoing each key
+        self.zobrist_hash = zobrist_hash
+
+    # passes the turn without moving a piece, used by null move pruning. Returns an undo record
+    # for unmake_null_move. The 50 move count is reset as a pass can't repeat an earlier position
+    def make_null_move(self):
+        undo = (self.en_passant_target,self.legal_moves,self.zobrist_hash,self.half_move_clock)
+        self.half_move_clock = 0
+        if self.en_passant_target:
+            self.zobrist_hash ^= ZOBRIST_EN_PASSANT_KEYS[self.en_passant_target[1]]
+            self.en_passant_target = None
+        self.zobrist_hash ^= ZOBRIST_BLACK_TO_MOVE
+        self.is_whites_move = not self.is_whites_move
+        self.legal_moves = None
+        return undo
+
+    # Reverses a pass made with make_null_move
+    def unmake_null_move(self,undo):
+        self.en_passant_target, self.legal_moves, self.zobrist_hash, self.half_move_clock = undo
+        self.is_whites_move = not self.is_whites_move
+
+    # Returns true if the side has any piece other than pawns and its king. Positions without
+    # one are where zugzwang is common
+    def has_non_pawn_material(self,white):
+        pieces = ('N','B','R','Q') if white else ('n','b','r','q')
+        for row in self.board:
+            for piece in row:
+                if piece in pieces:
+                    return True
+        return False
     
     # Returns true if a given move is a promotion
     def is_promotion(self,start_sqr,end_sqr):
@@ -197,37 +585,109 @@ class Position:
         return end_row in (0,7) and piece.lower() == 'p'
 
     
-    # gets legal moves in a position
+    # gets legal moves in a position as move tuples, for the ui and tools
     def get_legal_moves(self):
+        return [decode_move(code) for code in self.get_encoded_moves()]
+
+    # gets legal moves in a position as encoded moves, used by search
+    # checkers and pinned pieces are found once, then pseudo-legal moves are kept or dropped
+    # by cheap square lookups instead of trying each move on the board
+    def get_encoded_moves(self):
         # accesses cache if it exits
         if self.legal_moves is not None:
             return self.legal_moves
-        # otherwise generates moves
+        # otherwise generates moves and caches them
+        self.legal_moves = self._generate_legal_moves(False)
+        return self.legal_moves
+
+    # gets legal captures and promotions only as move tuples
+    def get_capture_moves(self):
+        return [decode_move(code) for code in self.get_encoded_captures()]
+
+    # gets legal captures and promotions only as encoded moves, used by quiescence search
+    def get_encoded_captures(self):
+        # filters the cached legal moves if we already have them
+        if self.legal_moves is not None:
+            board = self.board
+            en_passant_target = self.en_passant_target
+            captures = []
+            for code in self.legal_moves:
+                end_sqr = SQUARES[code >> 6 & 63]
+                if board[end_sqr[0]][end_sqr[1]] or code & PROMOTION_FLAG:
+                    captures.append(code)
+                elif end_sqr == en_passant_target and board[code >> 3 & 7][code & 7] in ('P','p'):
+                    captures.append(code)
+            return captures
+        return self._generate_legal_moves(True)
+
+    # generates legal moves, or only captures and promotions if captures_only is set
+    def _generate_legal_moves(self,captures_only):
+        white = self.is_whites_move
+        king_sqr = self.K_position if white else self.k_position
+        checkers, block_squares, pins = self._get_checks_and_pins(king_sqr,white)
+
+        # only the king can move out of a double check
+        if len(checkers) > 1:
+            pseudo_moves = self._king_moves(king_sqr,captures_only)
         else:
-            pseudo_moves = self._get_pseudo_legal_moves()
-            real_moves = []
-            for move in pseudo_moves:
-                new_pos = self.after_move(*move)[0]
-                # adds move if not in check
-                if not new_pos._is_in_check(self.is_whites_move):
+            pseudo_moves = self._get_pseudo_legal_moves(captures_only)
+
+        real_moves = []
+        for move in pseudo_moves:
+            start_sqr, end_sqr = SQUARES[move & 63], SQUARES[move >> 6 & 63]
+            # king moves must land on a square that is not attacked, castling has already
+            # been checked for attacked squares when it was generated
+            if start_sqr == king_sqr:
+                if abs(start_sqr[1] - end_sqr[1]) == 2 or self._is_king_move_safe(king_sqr,end_sqr,white):
                     real_moves.append(move)
-            # caches moves
-            self.legal_moves = real_moves
-            return real_moves
+            # en passant can uncover a check along the row of both pawns, so it is tried on the board
+            elif end_sqr == self.en_passant_target and self.get_piece_at(start_sqr) in ('P','p'):
+                undo, _ = self.make_move(start_sqr,end_sqr)
+                if not self._is_in_check(white):
+                    real_moves.append(move)
+                self.unmake_move(undo)
+            # in check other pieces must capture the checker or block the check
+            elif checkers and end_sqr not in block_squares:
+                continue
+            # pinned pieces must stay on the line between their king and the pinning piece
+            elif start_sqr in pins and end_sqr not in pins[start_sqr]:
+                continue
+            else:
+                real_moves.append(move)
+        return real_moves
     
     # Checks if a move is legal
     def is_legal_move(self,start_sqr,end_sqr):
         # gets legal moves in position
-        legal_moves = self.get_legal_moves()
+        legal_moves = self.get_encoded_moves()
         # returns true if the attempted move is in legal moves
         # queen portion is for if these is a promotion
-        return ((start_sqr,end_sqr) in legal_moves) or ((start_sqr,end_sqr,'q') in legal_moves)
+        code = encode_move((start_sqr,end_sqr))
+        return code in legal_moves or encode_move((start_sqr,end_sqr,'q')) in legal_moves
+
+    # checks if an encoded move, such as one from the transposition table, is legal without
+    # generating every legal move. Only the moving piece's moves are generated, then the move
+    # is tried on the board
+    def is_encoded_move_legal(self,code):
+        if self.legal_moves is not None:
+            return code in self.legal_moves
+        start_sqr = SQUARES[code & 63]
+        piece = self.get_piece_at(start_sqr)
+        white = self.is_whites_move
+        if not piece or piece.isupper() != white:
+            return False
+        if code not in self._get_pieces_pseudo_legal_moves(start_sqr,piece):
+            return False
+        undo, _ = self.make_encoded_move(code)
+        legal = not self._is_in_check(white)
+        self.unmake_move(undo)
+        return legal
     
     
     # evaluates a position
     def evaluate(self):
         # looks for stalemate and checkmate
-        if self.get_legal_moves() == []:
+        if self.get_encoded_moves() == []:
             # runs if we have checkmate
             if self._is_in_check(self.is_whites_move):
                 return float('-inf') if self.is_whites_move else float('inf')
@@ -239,127 +699,165 @@ class Position:
         if self.half_move_clock >= 100:
             return 0
         
-        # initialises score for non-checkmate, stalemate cases
-        score = 0
-        for row in self.board:
-            for piece in row:
-                # runs for non-empty squares
-                if piece:
-                    # runs for non-king white pieces
-                    if piece.isupper() and piece != 'K':
-                        score += piece_values[piece.lower()]
-                    # runs for non-king black pieces
-                    elif piece.islower() and piece != 'k':
-                        score -= piece_values[piece]
+        return self.static_evaluate()
 
-        return score / 100
+    # evaluates the material and piece placement only, without looking for checkmate or draws
+    def static_evaluate(self):
+        # blends midgame and endgame scores by how much material is left, all the terms are
+        # kept up to date as moves are made so this costs the same whatever the position
+        phase = min(self.phase,TOTAL_PHASE)
+        score = (self.midgame_score * phase + self.endgame_score * (TOTAL_PHASE - phase)) / TOTAL_PHASE
+        return round(score) / 100
 
     # Helper functions
     # --------------------------------------------------------------
-      
-    # Checks if a row, col combination is on the board
-    def _is_square_on_board(self,row,col):
-        return 0 <= row <= 7 and 0 <= col <= 7
-    
-    # checks if a square is attacked on a board
+
+    # checks if a square is attacked on a board, reading attacking squares from the
+    # precomputed tables
     def _is_square_attacked(self,square,by_white):
         # unpacks position
         row, col = square
-        # defines direction that is forward for attacked side
-        forward_direction = 1 if by_white else -1 
-        # looks for checks except for knight checks
-        directions = [(1,1),(-1,1),(-1,-1),(1,-1),(1,0),(-1,0),(0,1),(0,-1)]
-        for direction in directions:
-            row_direction, col_direction = direction
-            # checks out all valid square in the given directions
-            check_row = row + row_direction
-            check_col = col + col_direction
-            while True:
-                # checks if we are checking a valid square on the board
-                if self._is_square_on_board(check_row,check_col):
-                    detected_piece = self.get_piece_at((check_row,check_col))
-                    # checks if square non-empty
-                    if detected_piece:
-                        # breaks while loop if detects a piece of the same colour
-                        if by_white != detected_piece.isupper():
-                            break
-                        # runs if we find a piece of attacking colour
-                        else:
-                            # runs if we are on a rook direction
-                            if min(abs(row_direction),abs(col_direction)) == 0:
-                                # checks for rook or queen attack
-                                if detected_piece.lower() in ('r','q'):
-                                    return True
-                                # checks for king attack
-                                elif detected_piece.lower() == 'k':
-                                    if abs(check_row-row) == 1 or abs(check_col-col) == 1:
-                                        return True
-                                    else:
-                                        break
-                                else:
-                                    break
-                            # runs if we are on a bishop direction
-                            else:
-                                # checks for bishop or queen attack
-                                if detected_piece.lower() in ('b','q'):
-                                    return True
-                                # checks for king attack
-                                elif detected_piece.lower() == 'k':
-                                    if abs(check_row-row) == 1:
-                                        return True
-                                    else:
-                                        break
-                                # checks for pawn check
-                                elif detected_piece.lower() == 'p':
-                                    if forward_direction == check_row - row: # checks pawn is one square ahead
-                                        return True
-                                    else:
-                                        break
-                                else:
-                                    break
-                    # if no pieces are detected, continues to next square
-                    else:
-                        check_row += row_direction
-                        check_col += col_direction
-                # break while loop when we reach end of board in one direction
-                else:
+        board = self.board
+        # gets the attacking side's piece letters
+        if by_white:
+            pawn, knight, bishop, rook, queen, king = 'P','N','B','R','Q','K'
+        else:
+            pawn, knight, bishop, rook, queen, king = 'p','n','b','r','q','k'
+        # looks for knight and king attacks
+        for check_row, check_col in KNIGHT_TARGETS[row][col]:
+            if board[check_row][check_col] == knight:
+                return True
+        for check_row, check_col in KING_TARGETS[row][col]:
+            if board[check_row][check_col] == king:
+                return True
+        # looks for pawn attacks, attacking pawns stand where a defending pawn on this
+        # square would attack
+        for check_row, check_col in PAWN_ATTACKS[not by_white][row][col]:
+            if board[check_row][check_col] == pawn:
+                return True
+        # looks along rook and bishop lines, only the first piece on each line can attack
+        for ray in ROOK_RAY_TABLE[row][col]:
+            for check_row, check_col in ray:
+                detected_piece = board[check_row][check_col]
+                if detected_piece:
+                    if detected_piece == rook or detected_piece == queen:
+                        return True
                     break
-        # looks for knight attacks
-        knight_directions = [(1,2),(1,-2),(-1,2),(-1,-2),(2,1),(2,-1),(-2,1),(-2,-1)]
-        for direction in knight_directions:
-            row_direction, col_direction = direction
-            check_row = row + row_direction
-            check_col = col + col_direction
-            # checks if we are checking a valid square on the board
-            if self._is_square_on_board(check_row,check_col):
-                detected_piece = self.get_piece_at((check_row,check_col))
-                # checks if square non-empty
+        for ray in BISHOP_RAY_TABLE[row][col]:
+            for check_row, check_col in ray:
+                detected_piece = board[check_row][check_col]
                 if detected_piece:
-                    # continues while loop if detects a piece of the same colour
-                    if by_white != detected_piece.isupper():
-                        continue
-                    else:
-                        # checks if there is a knight on square
-                        if detected_piece.lower() == 'n':
-                            return True
-                        # if not a knight continues
-                        else:
-                            continue
+                    if detected_piece == bishop or detected_piece == queen:
+                        return True
+                    break
         # returns false if no attacks detected
         return False
 
+    # finds enemy pieces giving check and own pieces pinned to the king. Returns a list of
+    # checking squares, the set of squares that would resolve a single check (capturing the
+    # checker or blocking it), and a dict of pinned square -> squares it may move to
+    def _get_checks_and_pins(self,king_sqr,white):
+        checkers = []
+        block_squares = set()
+        pins = {}
+        row, col = king_sqr
+        board = self.board
+        # looks along each line from the king for sliding checks and pins
+        for ray_table, slider in ((ROOK_RAY_TABLE,'r'),(BISHOP_RAY_TABLE,'b')):
+            for ray in ray_table[row][col]:
+                pinned_sqr = None
+                for distance, (check_row, check_col) in enumerate(ray):
+                    detected_piece = board[check_row][check_col]
+                    if detected_piece:
+                        # runs for the first of our pieces on the line, a second one means no pin
+                        if detected_piece.isupper() == white:
+                            if pinned_sqr is not None:
+                                break
+                            pinned_sqr = (check_row,check_col)
+                        # runs for an enemy piece, which checks or pins if it slides this way
+                        else:
+                            if detected_piece.lower() in (slider,'q'):
+                                if pinned_sqr is None:
+                                    checkers.append((check_row,check_col))
+                                    block_squares.update(ray[:distance + 1])
+                                else:
+                                    pins[pinned_sqr] = set(ray[:distance + 1])
+                            break
+        # looks for knight and pawn checks, which can only be resolved by a capture
+        enemy_knight, enemy_pawn = ('n','p') if white else ('N','P')
+        for check_row, check_col in KNIGHT_TARGETS[row][col]:
+            if board[check_row][check_col] == enemy_knight:
+                checkers.append((check_row,check_col))
+                block_squares.add((check_row,check_col))
+        for check_row, check_col in PAWN_ATTACKS[white][row][col]:
+            if board[check_row][check_col] == enemy_pawn:
+                checkers.append((check_row,check_col))
+                block_squares.add((check_row,check_col))
+        return checkers, block_squares, pins
+
+    # checks a king can step to a square without being attacked there, the king is lifted off
+    # the board while checking so it can't block a slider attacking along its own line
+    def _is_king_move_safe(self,king_sqr,end_sqr,white):
+        row, col = king_sqr
+        king = self.board[row][col]
+        self.board[row][col] = None
+        safe = not self._is_square_attacked(end_sqr,not white)
+        self.board[row][col] = king
+        return safe
+
     # checks if the king is in check when given king position and board
     def _is_in_check(self,white):
         king_position = self.K_position if white else self.k_position
         return self._is_square_attacked(king_position, not white)
     
-    # Modifies a square on position's board
+    # works out the hash of the position from scratch
+    def _compute_hash(self):
+        zobrist_hash = castling_key(self.K_cq,self.K_ck,self.k_cq,self.k_ck)
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece:
+                    zobrist_hash ^= ZOBRIST_PIECE_KEYS[piece][row*8 + col]
+        if not self.is_whites_move:
+            zobrist_hash ^= ZOBRIST_BLACK_TO_MOVE
+        if self.en_passant_target:
+            zobrist_hash ^= ZOBRIST_EN_PASSANT_KEYS[self.en_passant_target[1]]
+        return zobrist_hash
+
+    # works out the midgame score, endgame score and phase of the position from scratch
+    def _compute_eval_state(self):
+        midgame_score = endgame_score = phase = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece:
+                    midgame_score += MIDGAME_VALUES[piece][row*8 + col]
+                    endgame_score += ENDGAME_VALUES[piece][row*8 + col]
+                    phase += PHASE_VALUES[piece]
+        return midgame_score, endgame_score, phase
+
+    # Modifies a square on position's board, updating the hash and evaluation terms for the
+    # pieces that leave and arrive on the square
     def _update_square(self,square,piece):
         row, col = square
+        index = row*8 + col
+        old_piece = self.board[row][col]
+        if old_piece:
+            self.zobrist_hash ^= ZOBRIST_PIECE_KEYS[old_piece][index]
+            self.midgame_score -= MIDGAME_VALUES[old_piece][index]
+            self.endgame_score -= ENDGAME_VALUES[old_piece][index]
+            self.phase -= PHASE_VALUES[old_piece]
+            self.pieces -= 1
+        if piece:
+            self.zobrist_hash ^= ZOBRIST_PIECE_KEYS[piece][index]
+            self.midgame_score += MIDGAME_VALUES[piece][index]
+            self.endgame_score += ENDGAME_VALUES[piece][index]
+            self.phase += PHASE_VALUES[piece]
+            self.pieces += 1
         self.board[row][col] = piece
 
-    # gets pawn moves
-    def _pawn_moves(self,square):
+    # gets pawn moves, only promotions and captures if captures_only is set
+    def _pawn_moves(self,square,captures_only=False):
         # unpacks square
         row,col = square
         # gets our piece
@@ -372,262 +870,156 @@ class Position:
         moves = []
         # gets promotion row
         promotion_row = 0 if piece_white else 7
+        # start square part of the encoded moves
+        start = row*8 + col
 
 
         # runs if one square forward is empty
         if not self.get_piece_at((row+forward_direction,col)):
             # runs if promoting
             if promotion_row == row + forward_direction:
-                end_sqr = (row+forward_direction,col)
-                moves.append((square,end_sqr,'q'))
-                moves.append((square,end_sqr,'r'))
-                moves.append((square,end_sqr,'b'))
-                moves.append((square,end_sqr,'n'))
+                code = start | ((row+forward_direction)*8 + col) << 6
+                for promotion_code in PROMOTION_CODES:
+                    moves.append(code | promotion_code)
             # runs if not promoting
-            else:
+            elif not captures_only:
                 # adds standard forward move
-                moves.append((square,(row+forward_direction,col)))
+                moves.append(start | ((row+forward_direction)*8 + col) << 6)
                 # calculates home row from promotion row
                 home_row = promotion_row - 6*forward_direction
                 
                 # runs if on home row and target square is empty
                 if row == home_row and not self.get_piece_at((row+2*forward_direction,col)):
-                    moves.append((square,(row+2*forward_direction,col)))
+                    moves.append(start | ((row+2*forward_direction)*8 + col) << 6)
 
             
         # checks diagonal moves
-        for diagonal in (1,-1):
-            check_row = row + forward_direction
-            check_col = col + diagonal
-            check_sqr = (check_row,check_col)
-            # runs if square on board
-            if self._is_square_on_board(check_row,check_col):
-                detected_piece = self.get_piece_at(check_sqr)
-                # runs if we have a diagonal capture
-                if (detected_piece and detected_piece.isupper() != piece_white):
-                    # runs if promoting
-                    if promotion_row == check_row:
-                        moves.append((square,check_sqr,'q'))
-                        moves.append((square,check_sqr,'r'))
-                        moves.append((square,check_sqr,'b'))
-                        moves.append((square,check_sqr,'n'))
-                    # runs if not promoting
-                    else:
-                        moves.append((square,check_sqr))
-                # runs if we have en passant
-                elif self.en_passant_target == check_sqr:
-                    moves.append((square,check_sqr))
+        for check_sqr in PAWN_ATTACKS[piece_white][row][col]:
+            detected_piece = self.board[check_sqr[0]][check_sqr[1]]
+            code = start | (check_sqr[0]*8 + check_sqr[1]) << 6
+            # runs if we have a diagonal capture
+            if (detected_piece and detected_piece.isupper() != piece_white):
+                # runs if promoting
+                if promotion_row == check_sqr[0]:
+                    for promotion_code in PROMOTION_CODES:
+                        moves.append(code | promotion_code)
+                # runs if not promoting
+                else:
+                    moves.append(code)
+            # runs if we have en passant
+            elif self.en_passant_target == check_sqr:
+                moves.append(code)
         return moves
 
-
-    # gets knight moves
-    def _knight_moves(self,square):
-        # unpacks square
-        row,col = square
-        # gets our piece
-        piece = self.get_piece_at(square)
+    # gets moves for pieces that step to a fixed set of squares (knights and kings)
+    def _step_moves(self,square,targets,captures_only=False):
+        board = self.board
         # gets our piece colour
-        piece_white = piece.isupper()
-        # defines knight directions
-        directions = [(1,2),(1,-2),(-1,2),(-1,-2),(2,1),(2,-1),(-2,1),(-2,-1)]
+        piece_white = board[square[0]][square[1]].isupper()
+        start = square[0]*8 + square[1]
         # initialises moves list
         moves = []
-        for direction in directions:
-            row_direction, col_direction = direction
-            check_row = row + row_direction
-            check_col = col + col_direction
-            # checks if we are checking a valid square on the board
-            if self._is_square_on_board(check_row,check_col):
-                detected_piece = self.get_piece_at((check_row,check_col))
-                # runs if we are on an empty square or enemy piece
-                if not (detected_piece and piece_white == detected_piece.isupper()):
-                    moves.append((square,(check_row,check_col)))              
+        for end_sqr in targets:
+            detected_piece = board[end_sqr[0]][end_sqr[1]]
+            # runs if we are on an empty square or enemy piece
+            if detected_piece:
+                if piece_white != detected_piece.isupper():
+                    moves.append(start | (end_sqr[0]*8 + end_sqr[1]) << 6)
+            elif not captures_only:
+                moves.append(start | (end_sqr[0]*8 + end_sqr[1]) << 6)
         return moves
 
-
-    # gets bishop moves
-    def _bishop_moves(self,square):
-        # unpacks our start square
-        row, col = square
-        # gets our piece
-        piece = self.get_piece_at(square)
+    # gets moves for sliding pieces along a list of precomputed rays
+    def _slider_moves(self,square,rays,captures_only=False):
+        board = self.board
         # gets our piece colour
-        piece_white = piece.isupper()
-        # defines initial directions for bishops
-        directions = [(1,1),(-1,1),(-1,-1),(1,-1)]
+        piece_white = board[square[0]][square[1]].isupper()
+        start = square[0]*8 + square[1]
         # initialises move list
         moves = []
-        for direction in directions:
-            row_direction, col_direction = direction
-            # checks out all valid square in the given directions
-            check_row = row + row_direction
-            check_col = col + col_direction
-            while True:
-                # checks if we are checking a valid square on the board
-                if self._is_square_on_board(check_row,check_col):
-                    detected_piece = self.get_piece_at((check_row,check_col))
-                    # checks if square non-empty
-                    if detected_piece:
-                        # breaks while loop if detects a piece of the same colour
-                        if piece_white == detected_piece.isupper():
-                            break
-                        # runs if we find a piece of opposite colour
-                        else:
-                            moves.append((square,(check_row,check_col)))
-                            break
-                    # if no pieces are detected, continues to next square
-                    else:
-                        moves.append((square,(check_row,check_col)))
-                        check_row += row_direction
-                        check_col += col_direction
-                # break while loop when we reach end of board in one direction
-                else:
+        for ray in rays:
+            # checks out squares along the ray until a piece is hit
+            for end_sqr in ray:
+                detected_piece = board[end_sqr[0]][end_sqr[1]]
+                # checks if square non-empty
+                if detected_piece:
+                    # captures if we find a piece of opposite colour, then stops either way
+                    if piece_white != detected_piece.isupper():
+                        moves.append(start | (end_sqr[0]*8 + end_sqr[1]) << 6)
                     break
+                # if no pieces are detected, continues to next square
+                if not captures_only:
+                    moves.append(start | (end_sqr[0]*8 + end_sqr[1]) << 6)
         return moves
 
+    # gets knight moves
+    def _knight_moves(self,square,captures_only=False):
+        return self._step_moves(square,KNIGHT_TARGETS[square[0]][square[1]],captures_only)
+
+    # gets bishop moves
+    def _bishop_moves(self,square,captures_only=False):
+        return self._slider_moves(square,BISHOP_RAY_TABLE[square[0]][square[1]],captures_only)
+
     # gets rook moves 
-    def _rook_moves(self,square):
-        # unpacks our start square
-        row, col = square
-        # gets our piece
-        piece = self.get_piece_at(square)
-        # gets our piece colour
-        piece_white = piece.isupper()
-        # defines directions for rooks moves
-        directions = [(1,0),(-1,0),(0,1),(0,-1)]
-        # initialises move list
-        moves = []
-        for direction in directions:
-            row_direction, col_direction = direction
-            # checks out all valid square in the given directions
-            check_row = row + row_direction
-            check_col = col + col_direction
-            while True:
-                # checks if we are checking a valid square on the board
-                if self._is_square_on_board(check_row,check_col):
-                    detected_piece = self.get_piece_at((check_row,check_col))
-                    # checks if square non-empty
-                    if detected_piece:
-                        # breaks while loop if detects a piece of the same colour
-                        if piece_white == detected_piece.isupper():
-                            break
-                        # runs if we find a piece of opposite colour
-                        else:
-                            moves.append((square,(check_row,check_col)))
-                            break
-                    # if no pieces are detected, continues to next square
-                    else:
-                        moves.append((square,(check_row,check_col)))
-                        check_row += row_direction
-                        check_col += col_direction
-                # break while loop when we reach end of board in one direction
-                else:
-                    break
-        return moves
+    def _rook_moves(self,square,captures_only=False):
+        return self._slider_moves(square,ROOK_RAY_TABLE[square[0]][square[1]],captures_only)
+
+    # gets queen moves
+    def _queen_moves(self,square,captures_only=False):
+        return self._slider_moves(square,QUEEN_RAY_TABLE[square[0]][square[1]],captures_only)
 
     # gets king moves
-    def _king_moves(self,square):
-        # unpacks square
-        row,col = square
-        # gets our piece
-        piece = self.get_piece_at(square)
-        # gets our piece colour
-        piece_white = piece.isupper()
-        # defines king directions
-        directions = [(1,1),(-1,1),(-1,-1),(1,-1),(1,0),(-1,0),(0,1),(0,-1)]
-        # initialises moves list
-        moves = []
+    def _king_moves(self,square,captures_only=False):
         # handles normal king moves
-        for direction in directions:
-            row_direction, col_direction = direction
-            check_row = row + row_direction
-            check_col = col + col_direction
-            # checks if we are checking a valid square on the board
-            if self._is_square_on_board(check_row,check_col):
-                detected_piece = self.get_piece_at((check_row,check_col))
-                # runs if we are on an empty square or enemy piece
-                if not (detected_piece and piece_white == detected_piece.isupper()):
-                    moves.append((square,(check_row,check_col)))              
-        
+        moves = self._step_moves(square,KING_TARGETS[square[0]][square[1]],captures_only)
         # handles castling
-        home_row = 7 if piece_white else 0
-        enemy_white = not piece_white
-        
-        # runs if has kingside castling rights
-        if (self.K_ck if piece_white else self.k_ck):
-            # runs if squares between king and rook are empty (kingside)
-            if not self.get_piece_at((home_row,5)) and not self.get_piece_at((home_row,6)):
-                # runs if king not in check or castling through check
-                if not self._is_square_attacked((home_row,4),enemy_white) and not self._is_square_attacked((home_row,5),enemy_white) and not self._is_square_attacked((home_row,6),enemy_white):
-                    moves.append((square,(home_row,6)))
-        # runs if has queenside castling rights
-        if (self.K_cq if piece_white else self.k_cq):
-            # runs if squares between king and rook are empty (queenside)
-            if not self.get_piece_at((home_row,3)) and not self.get_piece_at((home_row,2)) and not self.get_piece_at((home_row,1)):
-                # runs if king not in check or castling through check
-                if not self._is_square_attacked((home_row,4),enemy_white) and not self._is_square_attacked((home_row,3),enemy_white) and not self._is_square_attacked((home_row,2),enemy_white):
-                    moves.append((square,(home_row,2)))
-        
+        if not captures_only:
+            moves.extend(self._castling_moves(square,self.get_piece_at(square).isupper()))
         return moves
 
-    # gets queen moves
-    def _queen_moves(self,square):
-        # unpacks our start square
-        row, col = square
-        # gets our piece
-        piece = self.get_piece_at(square)
-        # gets our piece colour
-        piece_white = piece.isupper()
-        # defines initial directions for queens
-        directions = [(1,1),(-1,1),(-1,-1),(1,-1),(1,0),(-1,0),(0,1),(0,-1)]
-        # initialises move list
+    # gets castling moves for the king on a given square
+    def _castling_moves(self,square,piece_white):
         moves = []
-        for direction in directions:
-            row_direction, col_direction = direction
-            # checks out all valid square in the given directions
-            check_row = row + row_direction
-            check_col = col + col_direction
-            while True:
-                # checks if we are checking a valid square on the board
-                if self._is_square_on_board(check_row,check_col):
-                    detected_piece = self.get_piece_at((check_row,check_col))
-                    # checks if square non-empty
-                    if detected_piece:
-                        # breaks while loop if detects a piece of the same colour
-                        if piece_white == detected_piece.isupper():
-                            break
-                        # runs if we find a piece of opposite colour
-                        else:
-                            moves.append((square,(check_row,check_col)))
-                            break
-                    # if no pieces are detected, continues to next square
-                    else:
-                        moves.append((square,(check_row,check_col)))
-                        check_row += row_direction
-                        check_col += col_direction
-                # break while loop when we reach end of board in one direction
-                else:
-                    break
+        home_row = 7 if piece_white else 0
+        enemy_white = not piece_white
+        board_row = self.board[home_row]
+
+        # runs if has kingside castling rights and squares between king and rook are empty
+        kingside = (self.K_ck if piece_white else self.k_ck) and not board_row[5] and not board_row[6]
+        # runs if has queenside castling rights and squares between king and rook are empty
+        queenside = (self.K_cq if piece_white else self.k_cq) and not board_row[3] and not board_row[2] and not board_row[1]
+
+        # runs if king not in check, checked once for both sides
+        if (kingside or queenside) and not self._is_square_attacked((home_row,4),enemy_white):
+            start = square[0]*8 + square[1]
+            # runs if king not castling through check (kingside)
+            if kingside and not self._is_square_attacked((home_row,5),enemy_white) and not self._is_square_attacked((home_row,6),enemy_white):
+                moves.append(start | (home_row*8 + 6) << 6)
+            # runs if king not castling through check (queenside)
+            if queenside and not self._is_square_attacked((home_row,3),enemy_white) and not self._is_square_attacked((home_row,2),enemy_white):
+                moves.append(start | (home_row*8 + 2) << 6)
+        
         return moves
 
     # gets pseudo-legal moves for a piece in a particular position
     # assumes piece is correct colour to move
-    def _get_pieces_pseudo_legal_moves(self,square,piece):
+    def _get_pieces_pseudo_legal_moves(self,square,piece,captures_only=False):
         if piece.lower() == 'p':
-            return self._pawn_moves(square)
+            return self._pawn_moves(square,captures_only)
         elif piece.lower() == 'n':
-            return self._knight_moves(square)
+            return self._knight_moves(square,captures_only)
         elif piece.lower() == 'b':
-            return self._bishop_moves(square)
+            return self._bishop_moves(square,captures_only)
         elif piece.lower() == 'r':
-            return self._rook_moves(square)
+            return self._rook_moves(square,captures_only)
         elif piece.lower() == 'k':
-            return self._king_moves(square)
+            return self._king_moves(square,captures_only)
         elif piece.lower() == 'q':
-            return self._queen_moves(square)
+            return self._queen_moves(square,captures_only)
 
-    # gets legal moves in a given position
-    def _get_pseudo_legal_moves(self):
+    # gets pseudo-legal moves in a given position, only captures and promotions if
+    # captures_only is set
+    def _get_pseudo_legal_moves(self,captures_only=False):
         moves = []
         # loops over board
         for row in range(8):
@@ -642,7 +1034,7 @@ class Position:
                     continue
                 # runs if we find a piece with the correct colour
                 else:
-                    new_moves = self._get_pieces_pseudo_legal_moves((row,col),piece)
+                    new_moves = self._get_pieces_pseudo_legal_moves((row,col),piece,captures_only)
                     # adds unpacked list
                     moves.extend(new_moves)
         # returns pseudo legal moves
@@ -650,6 +1042,298 @@ class Position:
 
 
 
+# Move encoding
+# --------------------------------------------------------------
+# Moves are packed into 16 bits: bits 0-5 hold the start square index, bits 6-11 the end
+# square index, bits 12-13 the promotion piece and bit 14 marks a promotion. Move generation,
+# search and the transposition table all work on encoded moves, which are much smaller than
+# tuples, and the low 12 bits index the history and countermove tables directly. Tuples are
+# only made for the ui and tools. 0 is never a real move so it is used for "no move"
+PROMOTION_PIECES = ('n','b','r','q')
+PROMOTION_FLAG = 1 << 14
+# promotion bits for each piece in the order they are generated, queen first
+PROMOTION_CODES = tuple(PROMOTION_PIECES.index(piece) << 12 | PROMOTION_FLAG for piece in ('q','r','b','n'))
+
+# packs a move tuple into an int
+def encode_move(move):
+    start_sqr, end_sqr = move[0], move[1]
+    code = square_index(start_sqr) | square_index(end_sqr) << 6
+    if len(move) == 3:
+        code |= PROMOTION_PIECES.index(move[2]) << 12 | PROMOTION_FLAG
+    return code
+
+# unpacks an int back into the move tuple used by the rest of the engine
+def decode_move(code):
+    start_sqr = SQUARES[code & 63]
+    end_sqr = SQUARES[code >> 6 & 63]
+    if code & PROMOTION_FLAG:
+        return (start_sqr,end_sqr,PROMOTION_PIECES[code >> 12 & 3])
+    return (start_sqr,end_sqr)
+
+# gets the algebraic name of a square, e.g. (7,4) is e1
+def square_name(square):
+    row, col = square
+    return 'abcdefgh'[col] + str(8 - row)
+
+# gets the square for an algebraic name
+def parse_square(name):
+    return (8 - int(name[1]), 'abcdefgh'.index(name[0]))
+
+# converts a move tuple to long algebraic notation as used by UCI, e.g. e2e4 or e7e8q
+def move_to_uci(move):
+    return square_name(move[0]) + square_name(move[1]) + (move[2] if len(move) == 3 else '')
+
+# converts long algebraic notation back to a move tuple, castling is the king's two square move
+def uci_to_move(text):
+    start_sqr, end_sqr = parse_square(text[0:2]), parse_square(text[2:4])
+    if len(text) == 5:
+        return (start_sqr,end_sqr,text[4].lower())
+    return (start_sqr,end_sqr)
+
+
+# Transposition table
+# --------------------------------------------------------------
+# bound types stored with each score
+EXACT = 0
+LOWER_BOUND = 1 # true score is at least the stored score (search failed high)
+UPPER_BOUND = 2 # true score is at most the stored score (search failed low)
+
+# scores are stored as whole centipawns, with mates stored as a large sentinel value
+TT_MATE_SCORE = 1 << 30
+
+# class for a fixed size hash table of search results. Entries live in one flat array of
+# 64-bit words, two words per entry (hash, packed data) and two entries per bucket. The first
+# entry of a bucket keeps the deepest result, the second is always replaced.
+# The table can live in a buffer shared between processes, which write to it without locks.
+# The hash word is stored XORed with the data word, so an entry torn by two processes writing
+# at once no longer matches its hash and is ignored rather than read as garbage
+class TranspositionTable:
+    def __init__(self,size_mb=16,buffer=None):
+        # 16 bytes per entry, 32 bytes per bucket
+        self.bucket_count = max(1, size_mb * 1024 * 1024 // 32)
+        if buffer is None:
+            self.table = array('Q', bytes(self.bucket_count * 32))
+        # uses the start of a buffer such as a multiprocessing.shared_memory block in place
+        else:
+            self.table = memoryview(buffer)[:self.bucket_count * 32].cast('Q')
+        # search generation, lets results from earlier searches be replaced first
+        self.generation = 0
+
+    # clears every entry
+    def clear(self):
+        self.table[:] = array('Q', bytes(self.bucket_count * 32))
+        self.generation = 0
+
+    # lets go of a shared buffer so it can be closed, the table can't be used afterwards
+    def release(self):
+        if isinstance(self.table, memoryview):
+            self.table.release()
+
+    # copies every entry from another table of the same size, such as one in shared memory
+    def copy_from(self,other):
+        memoryview(self.table)[:] = other.table
+
+    # marks the start of a new search so older entries become preferred for replacement
+    def new_search(self):
+        self.generation = (self.generation + 1) & 63
+
+    # looks up a position hash, returns (depth, score, bound, encoded move) or None if not stored
+    def probe(self,zobrist_hash):
+        index = (zobrist_hash % self.bucket_count) * 4
+        table = self.table
+        data = table[index + 1]
+        if table[index] ^ data != zobrist_hash:
+            data = table[index + 3]
+            if table[index + 2] ^ data != zobrist_hash:
+                return None
+        move_code = data & 0xFFFF
+        return (data >> 16 & 0xFF,
+                self._unpack_score(data >> 32),
+                data >> 24 & 3,
+                move_code or None)
+
+    # stores a search result for a position hash, move is an encoded move or None
+    def store(self,zobrist_hash,depth,score,bound,move):
+        data = ((move or 0)
+                | min(depth,255) << 16
+                | bound << 24
+                | self.generation << 26
+                | self._pack_score(score) << 32)
+        index = (zobrist_hash % self.bucket_count) * 4
+        table = self.table
+        # replaces the depth preferred entry if it is the same position, from an older
+        # search, or not as deep as the new result
+        stored = table[index + 1]
+        if (table[index] ^ stored == zobrist_hash or stored >> 26 & 63 != self.generation
+                or stored >> 16 & 0xFF <= depth):
+            table[index] = zobrist_hash ^ data
+            table[index + 1] = data
+        # otherwise uses the always replace entry
+        else:
+            table[index + 2] = zobrist_hash ^ data
+            table[index + 3] = data
+
+    # converts a score in pawns to an unsigned 32-bit int
+    def _pack_score(self,score):
+        if score == float('inf'):
+            centipawns = TT_MATE_SCORE
+        elif score == float('-inf'):
+            centipawns = -TT_MATE_SCORE
+        else:
+            centipawns = round(score * 100)
+        return centipawns + (1 << 31)
+
+    # converts a stored score back to pawns
+    def _unpack_score(self,packed):
+        centipawns = packed - (1 << 31)
+        if centipawns == TT_MATE_SCORE:
+            return float('inf')
+        elif centipawns == -TT_MATE_SCORE:
+            return float('-inf')
+        return centipawns / 100
+
+
+
+# raised inside a search when its time or node budget runs out, unwinding back to the
+# iterative deepening driver
+class SearchAborted(Exception):
+    pass
+
+
+# class for counters filled in by a search when attached to Game.stats, used to tune move
+# ordering and pruning. Nothing is counted when Game.stats is None
+class SearchStats:
+    def __init__(self):
+        self.reset()
+
+    # sets every counter back to zero
+    def reset(self):
+        self.nodes_per_ply = [] # search_to_depth nodes at each ply from the root
+        self.quiescence_nodes = 0
+        self.leaf_evaluations = 0 # evaluations at the end of the search, including stand pats
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0 # cutoffs caused by the first move searched
+        self.legal_move_requests = 0 # full legal move lists needed by the move picker
+        self.legal_move_cache_hits = 0 # legal moves already stored on the position
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tt_cutoffs = 0
+        self.null_move_cutoffs = 0
+        self.tablebase_hits = 0
+        self.iterations = [] # (depth, seconds, nodes) spent on each completed iteration
+
+    # counts a search_to_depth node at a ply
+    def add_node(self,ply):
+        nodes_per_ply = self.nodes_per_ply
+        while len(nodes_per_ply) <= ply:
+            nodes_per_ply.append(0)
+        nodes_per_ply[ply] += 1
+
+    # fraction of beta cutoffs made by the first move, higher means better move ordering
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.beta_cutoffs if self.beta_cutoffs else 0.0
+
+    # fraction of probes that found the position in the transposition table
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    # fraction of legal move requests answered from the position's cache
+    def legal_move_cache_hit_rate(self):
+        return self.legal_move_cache_hits / self.legal_move_requests if self.legal_move_requests else 0.0
+
+    # average growth in nodes from one iteration to the next
+    def effective_branching_factor(self):
+        nodes = [iteration[2] for iteration in self.iterations]
+        if len(nodes) < 2 or not nodes[0]:
+            return 0.0
+        return (nodes[-1] / nodes[0]) ** (1 / (len(nodes) - 1))
+
+    # gets the counters as a plain dict, e.g. for writing as JSON
+    def to_dict(self):
+        return {
+            "nodes_per_ply": list(self.nodes_per_ply),
+            "quiescence_nodes": self.quiescence_nodes,
+            "leaf_evaluations": self.leaf_evaluations,
+            "beta_cutoffs": self.beta_cutoffs,
+            "first_move_cutoff_rate": self.first_move_cutoff_rate(),
+            "legal_move_cache_hit_rate": self.legal_move_cache_hit_rate(),
+            "tt_probes": self.tt_probes,
+            "tt_hit_rate": self.tt_hit_rate(),
+            "tt_cutoffs": self.tt_cutoffs,
+            "null_move_cutoffs": self.null_move_cutoffs,
+            "tablebase_hits": self.tablebase_hits,
+            "effective_branching_factor": self.effective_branching_factor(),
+            "iterations": [list(iteration) for iteration in self.iterations],
+        }
+
+    # gets a readable multi-line summary
+    def summary(self):
+        lines = [
+            f"nodes per ply: {' '.join(str(nodes) for nodes in self.nodes_per_ply)}",
+            f"quiescence nodes: {self.quiescence_nodes}",
+            f"leaf evaluations: {self.leaf_evaluations}",
+            f"beta cutoffs: {self.beta_cutoffs} ({self.first_move_cutoff_rate():.1%} on first move)",
+            f"null move cutoffs: {self.null_move_cutoffs}",
+            f"tablebase hits: {self.tablebase_hits}",
+            f"legal move cache hits: {self.legal_move_cache_hit_rate():.1%} of {self.legal_move_requests}",
+            f"tt hits: {self.tt_hit_rate():.1%} of {self.tt_probes} probes, {self.tt_cutoffs} cutoffs",
+            f"effective branching factor: {self.effective_branching_factor():.2f}",
+        ]
+        for depth, seconds, nodes in self.iterations:
+            lines.append(f"depth {depth}: {nodes} nodes in {seconds:.3f}s")
+        return "\n".join(lines)
+
+
+# deepest iteration the iterative deepening driver will start
+MAX_SEARCH_DEPTH = 64
+# most plies from the root that killer moves are kept for
+MAX_SEARCH_PLY = 128
+
+# move ordering scores for each kind of move, quiet moves are scored by their history value
+# which stays below KILLER_SCORE in practice
+TT_MOVE_SCORE = 1 << 40
+CAPTURE_SCORE = 1 << 36
+KILLER_SCORE = 1 << 34
+COUNTERMOVE_SCORE = KILLER_SCORE - 1
+
+# evaluations are whole centipawns (see static_evaluate), so scores differ by at least this
+SCORE_GRANULARITY = 0.01
+# width of zero windows, half the granularity so no score can fall inside one even when float
+# rounding leaves a bound just off the centipawn grid
+NULL_WINDOW = SCORE_GRANULARITY / 2
+# null move pruning is tried from NULL_MOVE_MIN_DEPTH, searching NULL_MOVE_REDUCTION plies
+# shallower (one more from NULL_MOVE_DEEP_DEPTH)
+NULL_MOVE_MIN_DEPTH = 3
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_DEEP_DEPTH = 7
+# late move reductions apply from LMR_MIN_DEPTH to quiet moves after the first LMR_MIN_MOVES,
+# reducing by two plies after LMR_DEEP_MOVES moves once the depth reaches LMR_DEEP_DEPTH
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVES = 3
+LMR_DEEP_MOVES = 6
+LMR_DEEP_DEPTH = 6
+# half width of the first root window in pawns, and the widest window tried before giving up
+# on aspiration and searching the full window
+ASPIRATION_WINDOW = 0.25
+ASPIRATION_MAX_WINDOW = 4.0
+# score in pawns for a position the endgame tablebase says is won, below mate so the search
+# still prefers a forced mate it has found
+TABLEBASE_WIN_SCORE = 200.0
+# history values are seeded below this in parallel search helpers, far below a real cutoff bonus
+HISTORY_NOISE = 16
+# Game settings copied to parallel search workers
+SEARCH_OPTIONS = ('use_quiescence','use_pvs','use_null_move','use_lmr','use_aspiration')
+# seconds between checks of the caller's stop event while parallel search workers run
+SMP_POLL_INTERVAL = 0.05
+# piece ranks used for most valuable victim / least valuable attacker ordering and promotions
+MVV_LVA_VALUES = {'p':1,'n':2,'b':3,'r':4,'q':5,'k':6,
+                  'P':1,'N':2,'B':3,'R':4,'Q':5,'K':6}
+
+# safety margin (in pawns) for delta pruning in quiescence search, captures that can't bring
+# the score within this margin of alpha (or beta for black) are skipped
+DELTA_MARGIN = 2.0
+
+
 # class for managing evolution of game
 class Game:
     # saves initial board state
@@ -664,23 +1348,66 @@ class Game:
         ["R","N","B","Q","K","B","N","R"]  # White back rank
         ]
     
-    def __init__(self,board_state=initial_board_state):
-        # sets up board state for standard chess starting position
-        self.position = Position(board_state)
+    # tt_size_mb sets the memory used by the transposition table
+    def __init__(self,board_state=initial_board_state,tt_size_mb=16,tt=None):
+        # sets up board state for standard chess starting position, copying the rows so moves made
+        # in place never touch the board that was passed in
+        self.position = Position([row[:] for row in board_state])
         
         # Adds list of past moves
         self.move_history = []
 
-        # stores repeatable piece positions
+        # stores repeatable piece positions, and how many times each has occurred
         self.repeatable_positions = [self.get_position_key(self.position)]
+        self.position_counts = {self.repeatable_positions[0]: 1}
+        # keys of the positions leading to the one being searched, pushed and popped as moves
+        # are made and unmade
+        self.hash_stack = []
+        # positions leading to the searched one when it is not the game's position, or None
+        self.root_history = None
+
+        # remembers search results between positions and searches, a table can be passed in
+        # to share it with other games
+        self.tt = TranspositionTable(tt_size_mb) if tt is None else tt
+
+        # search limits and counters, set by the iterative deepening driver
+        self.nodes = 0 # nodes visited in the current search
+        self.time_limit = None # seconds the search may take, None for no limit
+        self.node_limit = None # nodes the search may visit, None for no limit
+        self.limit_start = (0.0, 0) # perf_counter time and node count the limits count from
+        self.pondering = False # set while searching on the opponent's time, limits don't apply
+        self.pv_moves = {} # principal variation of the last completed iteration, hash -> move
+        self.completed_depth = 0 # deepest iteration finished by the last search
+        self.stop_event = None # event that stops the search once set, used by parallel search
+        self.move_order_seed = None # seeds noise in the history table so parallel searches differ
+        self.search_pool = None # parallel search processes kept between searches, see smp_search
+        # called after each completed iteration with (depth, score, nodes, seconds, principal variation)
+        self.info_callback = None
+        self.stats = None # SearchStats filled in during search when set
+        self.book = None # opening book, any object with choose_move(position) such as a PolyglotBook
+        # endgame tablebase such as a SyzygyTablebase, any object with max_pieces,
+        # probe_wdl(position) and probe_root(position)
+        self.tablebase = None
+        self.use_quiescence = True # resolves captures at the end of the search instead of evaluating
+        # selective search techniques, can be turned off to compare node counts
+        self.use_pvs = True # searches moves after the first with a zero window
+        self.use_null_move = True # cuts off if passing the turn still fails high
+        self.use_lmr = True # searches late quiet moves at reduced depth
+        self.use_aspiration = True # searches the root with a narrow window around the last score
+        # move ordering tables filled in during search
+        self.reset_move_ordering()
     
-    # gets a key that represents the position for repition checks
-    # NB does not include castling info as list of repeatable positions is automatically cleared
-    # if a change in castling rights is detected
+    # replaces the game position, forgetting the moves that led to the old one
+    def set_position(self,position):
+        self.position = position
+        self.move_history = []
+        self.repeatable_positions = [self.get_position_key(position)]
+        self.position_counts = {self.repeatable_positions[0]: 1}
+
+    # gets a key that represents the position for repition checks, this is the zobrist hash
+    # kept up to date by the position as moves are made
     def get_position_key(self,position):
-        return (tuple(tuple(row) for row in position.board),
-                position.is_whites_move,
-                position.en_passant_target)
+        return position.zobrist_hash
 
     # modifies the game position
     def make_move(self,start_sqr,end_sqr,promoting_piece='q'):
@@ -692,122 +1419,324 @@ class Game:
         # Runs if move made does not allow repetitions
         if breaks_repetitions:
             self.repeatable_positions.clear()
+            self.position_counts.clear()
         
         # gets a key to represent the position
         position_key = self.get_position_key(self.position)
-        # adds position to list
+        # adds position to list and counts it
         self.repeatable_positions.append(position_key)
+        self.position_counts[position_key] = self.position_counts.get(position_key, 0) + 1
 
-    # checks if we have threefold repetition when given a position history, and
-    # returns the key of the passed position if there is no repetition (path is pos history)
-    # only used for search, as it acts as if we have not yet made the move to the new position
-    def is_threefold_repetition(self,position,path):
-        # if length of path is too short, know that no rep has occured
-        if len(path) <= 6:
-            return False, None
-        else:
-            key = self.get_position_key(position)
-            return path.count(key) >= 2, key
+    # checks if a position reached in search has occurred twice before in the hash stack, which
+    # holds the positions before it (the move to the new position has not been pushed yet)
+    def is_threefold_repetition(self,position):
+        hash_stack = self.hash_stack
+        # a position can only repeat with the same side to move, so only every second entry is
+        # checked, and never further back than the last capture or pawn move
+        index = len(hash_stack) - 4
+        stop = len(hash_stack) - position.half_move_clock
+        if index < stop:
+            return False
+        key = position.zobrist_hash
+        repeats = 0
+        while index >= stop and index >= 0:
+            if hash_stack[index] == key:
+                repeats += 1
+                if repeats == 2:
+                    return True
+            index -= 2
+        return False
     
-    # reorders legal moves so best moves are likely to be early in list, resulting
-    # in more efficient alpha beta pruning
-    def order_moves(self,position,moves):
-        # function to score each type of move so they can be sorted with this as the key
-        def score_move(move):
-            score = 0
-            
-            start_sqr = move[0]
-            end_sqr = move[1]
-            moving_piece = position.get_piece_at(start_sqr)
-            target_piece = position.get_piece_at(end_sqr)
-            
-            # runs if we have a promotion that is not a capture
-            # adds value of promoted piece to score minus pawn value
-            if len(move) == 3 and not target_piece:
-                promotion_piece = move[2]
-                if promotion_piece == 'q':
-                    score += 800
-                elif promotion_piece == 'r':
-                    score += 400
-                elif promotion_piece == 'b':
-                    score += 220
-                else:
-                    score += 200
-            # runs if we have promotion capture, add value of promoted piece as
-            # pawn value will be subtracted later
-            elif len(move) == 3:
-                promotion_piece = move[2]
-                if promotion_piece == 'q':
-                    score += 800
-                elif promotion_piece == 'r':
-                    score += 400
-                elif promotion_piece == 'b':
-                    score += 220
-                else:
-                    score += 200
-            # runs if we have a capture, scores capture like we have made a trade
-            if target_piece:
-                moving_piece_type = moving_piece.lower()
-                target_piece_type = target_piece.lower()
-                # ignores king captures for now
-                if moving_piece_type != 'k':
-                    # + 10 is added to prefer even trades over non-captures
-                    score += piece_values[target_piece_type] - piece_values[moving_piece_type] + 10
-            
-            return score
-        # sorts list of moves using our scoring function
-        return sorted(moves,key=score_move,reverse=True)
+    # clears killer, history and countermove tables, called at the start of each search
+    def reset_move_ordering(self):
+        # two quiet moves per ply that recently caused a beta cutoff
+        self.killers = [[None,None] for _ in range(MAX_SEARCH_PLY)]
+        # score for each quiet (start square, end square) pair, raised when it causes a cutoff,
+        # indexed by the low 12 bits of the encoded move
+        if self.move_order_seed is None:
+            self.history = [0] * 4096
+        else:
+            rng = random.Random(self.move_order_seed)
+            self.history = [rng.randrange(HISTORY_NOISE) for _ in range(4096)]
+        # quiet move that refuted each (start square, end square) of the opponent's last move
+        self.countermoves = [None] * 4096
+
+    # records a quiet move that caused a beta cutoff in the killer, history and countermove tables
+    def update_move_ordering(self,move,depth,ply,previous_move):
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history[move & 4095] += depth * depth
+        if previous_move is not None:
+            self.countermoves[previous_move & 4095] = move
+
+    # reorders encoded legal moves so best moves are likely to be early in list, resulting
+    # in more efficient alpha beta pruning. The transposition table move goes first, then
+    # captures and promotions by most valuable victim / least valuable attacker, then killer
+    # moves, the countermove and remaining quiet moves by their history score. ply and
+    # previous_move are only needed for the killer and countermove tables
+    def order_moves(self,position,moves,tt_move=None,ply=None,previous_move=None):
+        board = position.board
+        en_passant_target = position.en_passant_target
+        history = self.history
+        killer_1, killer_2 = self.killers[ply] if ply is not None and ply < MAX_SEARCH_PLY else (None,None)
+        countermove = None
+        if previous_move is not None:
+            countermove = self.countermoves[previous_move & 4095]
+
+        scored_moves = []
+        for move in moves:
+            end_sqr = SQUARES[move >> 6 & 63]
+            victim = board[end_sqr[0]][end_sqr[1]]
+            if move == tt_move:
+                score = TT_MOVE_SCORE
+            # captures and promotions, en passant counts as taking a pawn
+            elif victim or move & PROMOTION_FLAG or end_sqr == en_passant_target:
+                attacker = board[move >> 3 & 7][move & 7]
+                if not victim and attacker in ('P','p') and end_sqr == en_passant_target:
+                    victim = attacker
+                score = CAPTURE_SCORE + (MVV_LVA_VALUES[victim] * 8 - MVV_LVA_VALUES[attacker] if victim else 0)
+                if move & PROMOTION_FLAG:
+                    score += MVV_LVA_VALUES[PROMOTION_PIECES[move >> 12 & 3]] * 8
+            elif move == killer_1:
+                score = KILLER_SCORE + 1
+            elif move == killer_2:
+                score = KILLER_SCORE
+            elif move == countermove:
+                score = COUNTERMOVE_SCORE
+            else:
+                score = history[move & 4095]
+            scored_moves.append((score,move))
+        # sorts on the score only, so equal scores keep generator order
+        scored_moves.sort(key=itemgetter(0),reverse=True)
+        return [move for _, move in scored_moves]
+
+    # yields encoded legal moves in stages: the hash move, captures that don't lose material,
+    # killers and the countermove, quiet moves by history score, then captures that do. Each
+    # stage is only generated once the ones before it are used up, so after an early cutoff the
+    # rest of the moves are never generated or sorted. The position must be back as it was
+    # each time the next move is asked for
+    def pick_moves(self,position,hash_move=None,ply=None,previous_move=None):
+        board = position.board
+        en_passant_target = position.en_passant_target
+        white = position.is_whites_move
+        yielded = [] # moves from the single move stages, skipped when they come up again
+
+        # hash move, checked for legality as it may come from a different position
+        if hash_move is not None and position.is_encoded_move_legal(hash_move):
+            yielded.append(hash_move)
+            yield hash_move
+
+        # captures and promotions by most valuable victim / least valuable attacker, keeping
+        # back captures of defended pieces by more valuable pieces
+        bad_captures = []
+        for move in self.order_moves(position,position.get_encoded_captures()):
+            if move in yielded:
+                continue
+            end_sqr = SQUARES[move >> 6 & 63]
+            victim = board[end_sqr[0]][end_sqr[1]]
+            if victim and not move & PROMOTION_FLAG:
+                attacker = board[move >> 3 & 7][move & 7].lower()
+                if (attacker != 'k' and piece_values[attacker] > piece_values[victim.lower()]
+                        and position._is_square_attacked(end_sqr,not white)):
+                    bad_captures.append(move)
+                    continue
+            yield move
+
+        # killers and the countermove, if they are quiet and legal here. A pawn move to the en
+        # passant square is a capture, which was already yielded
+        killer_1, killer_2 = self.killers[ply] if ply is not None and ply < MAX_SEARCH_PLY else (None,None)
+        countermove = self.countermoves[previous_move & 4095] if previous_move is not None else None
+        for move in (killer_1,killer_2,countermove):
+            if move is None or move in yielded:
+                continue
+            end_sqr = SQUARES[move >> 6 & 63]
+            if board[end_sqr[0]][end_sqr[1]] or move & PROMOTION_FLAG:
+                continue
+            if end_sqr == en_passant_target and board[move >> 3 & 7][move & 7] in ('P','p'):
+                continue
+            if not position.is_encoded_move_legal(move):
+                continue
+            yielded.append(move)
+            yield move
+
+        # remaining quiet moves, needing the full legal move list
+        stats = self.stats
+        if stats is not None:
+            stats.legal_move_requests += 1
+            stats.legal_move_cache_hits += position.legal_moves is not None
+        history = self.history
+        quiet_moves = []
+        for move in position.get_encoded_moves():
+            end_sqr = SQUARES[move >> 6 & 63]
+            if board[end_sqr[0]][end_sqr[1]] or move & PROMOTION_FLAG or move in yielded:
+                continue
+            if end_sqr == en_passant_target and board[move >> 3 & 7][move & 7] in ('P','p'):
+                continue
+            quiet_moves.append(move)
+        # sorting is stable, so equal history scores keep generator order
+        quiet_moves.sort(key=lambda move: history[move & 4095],reverse=True)
+        yield from quiet_moves
+
+        yield from bad_captures
 
         
 
     # depth based search, implemenents minimax with alpha beta pruning
-    def search_to_depth(self,position,depth,path=None,alpha=float('-inf'), beta=float('inf')):
-        # gets legal moves for search
-        legal_moves = position.get_legal_moves()
-        # gets starting path
-        if path is None:
-            path = self.repeatable_positions
-        
-        # evaluates position for terminal nodes, 50-move rule checkmate and stalemate
-        if depth == 0 or legal_moves == []:
+    # moves are made and unmade in place, so the root call searches on a copy of the position
+    # to leave the position passed in (usually the one the ui is drawing) untouched
+    # ply counts moves from the root and previous_move is the move that led to this position,
+    # both are used for move ordering. Moves are encoded inside the search, the root gives its
+    # best move back as a tuple
+    def search_to_depth(self,position,depth,alpha=float('-inf'), beta=float('inf'),ply=0,previous_move=None):
+        # gets the starting hash stack and copy of the root position. The stack starts with the
+        # game's positions when searching the game position, so repetitions of them are seen
+        is_root = ply == 0
+        if is_root:
+            if self.root_history is not None:
+                self.hash_stack = self.root_history[:]
+            elif self.repeatable_positions and self.repeatable_positions[-1] == position.zobrist_hash:
+                self.hash_stack = self.repeatable_positions[:]
+            else:
+                self.hash_stack = [position.zobrist_hash]
+            position = position.get_position_copy()
+
+        # counts node and periodically checks whether the search has run out of budget
+        self.nodes += 1
+        if self.nodes & 63 == 0 and self.is_search_limit_reached():
+            raise SearchAborted()
+
+        # evaluates position for terminal nodes, playing out captures first so the evaluation
+        # is not taken half way through an exchange
+        stats = self.stats
+        if stats is not None:
+            stats.add_node(ply)
+        if depth == 0:
+            if self.use_quiescence:
+                return self.quiescence_search(position,alpha,beta), None
+            if stats is not None:
+                stats.leaf_evaluations += 1
             return position.evaluate(), None # None makes sure we return a tuple
 
+        # looks up the position in the transposition table, a result from a deep enough search
+        # can narrow the window or cut off the search (not at the root, which must return a move)
+        alpha_original, beta_original = alpha, beta
+        tt_move = None
+        entry = self.tt.probe(position.zobrist_hash)
+        if stats is not None:
+            stats.tt_probes += 1
+            stats.tt_hits += entry is not None
+        if entry is not None:
+            tt_depth, tt_score, tt_bound, tt_move = entry
+            if not is_root and tt_depth >= depth:
+                if tt_bound == EXACT:
+                    if stats is not None:
+                        stats.tt_cutoffs += 1
+                    return tt_score, tt_move
+                elif tt_bound == LOWER_BOUND:
+                    alpha = max(alpha, tt_score)
+                else:
+                    beta = min(beta, tt_score)
+                if alpha >= beta:
+                    if stats is not None:
+                        stats.tt_cutoffs += 1
+                    return tt_score, tt_move
+
+        # looks up positions with few enough pieces in the endgame tablebase, which gives the
+        # exact result. Only done straight after a capture or pawn move (when the 50 move count
+        # is zero) and without castling rights, as the tables know about neither
+        if not is_root and position.half_move_clock == 0 and self.can_probe_tablebase(position):
+            wdl = self.tablebase.probe_wdl(position)
+            if wdl is not None:
+                if stats is not None:
+                    stats.tablebase_hits += 1
+                score = self.get_tablebase_score(wdl,position.is_whites_move)
+                self.tt.store(position.zobrist_hash,depth,score,EXACT,None)
+                return score, None
+
+        white = position.is_whites_move
+        in_check = position._is_in_check(white)
+
+        # null move pruning, if the side to move could pass and a shallower search still can't
+        # get back into the window the position is good enough to cut off straight away. Not
+        # tried in check, straight after another pass, or with only pawns left as passing
+        # may then be better than any move (zugzwang)
+        if (self.use_null_move and not is_root and previous_move is not None and depth >= NULL_MOVE_MIN_DEPTH
+                and not in_check and position.has_non_pawn_material(white)):
+            stand_pat = position.static_evaluate()
+            if (stand_pat >= beta) if white else (stand_pat <= alpha):
+                reduction = NULL_MOVE_REDUCTION + (depth >= NULL_MOVE_DEEP_DEPTH)
+                null_undo = position.make_null_move()
+                self.hash_stack.append(position.zobrist_hash)
+                if white:
+                    score, _ = self.search_to_depth(position,depth - 1 - reduction,beta - NULL_WINDOW,beta,ply + 1)
+                else:
+                    score, _ = self.search_to_depth(position,depth - 1 - reduction,alpha,alpha + NULL_WINDOW,ply + 1)
+                self.hash_stack.pop()
+                position.unmake_null_move(null_undo)
+                # returns the bound rather than the score so mates found after a pass aren't trusted
+                if (score >= beta) if white else (score <= alpha):
+                    if stats is not None:
+                        stats.null_move_cutoffs += 1
+                    return (beta if white else alpha), None
+
         # sets worst possible best scores for each side so there is always a point of comparison
         # for first evaluate score
-        best_score = float('-inf') if position.is_whites_move else float('inf')
-        best_move = legal_moves[0] # fallback for if all moves lead to mate
+        best_score = float('-inf') if white else float('inf')
+        best_move = None
 
-        # add move ordering
-        ordered_moves = self.order_moves(position,legal_moves)
+        # add move ordering, the previous iteration's principal variation takes priority
+        # over the transposition table move. Moves are picked lazily in stages
+        pv_move = self.pv_moves.get(position.zobrist_hash)
+        picked_moves = self.pick_moves(position,tt_move if pv_move is None else pv_move,ply,previous_move)
 
 
         # loops through legal moves in position
-        for move in ordered_moves:
-            # gets position after move, and sees if move irreveribly changes position
-            new_position, breaks = position.after_move(*move)
-            # runs if position permenantly changed
-            if breaks:
-                key = self.get_position_key(new_position)
-                new_path = [key]
-                # recursively calls function to eventually get score
-                score, _ = self.search_to_depth(new_position,depth - 1,new_path,alpha,beta)
-            # checks for threefold repetition
+        for move_number, move in enumerate(picked_moves):
+            # fallback for if all moves lead to mate
+            if move_number == 0:
+                best_move = move
+            # makes move, irreversible moves reset the 50 move count so end the repetition check
+            undo, _ = position.make_encoded_move(move)
+            is_repetition = self.is_threefold_repetition(position)
+            self.hash_stack.append(position.zobrist_hash)
+
+            # repetitions are scored as a draw
+            if is_repetition:
+                score = 0
+            # the first move is searched with the full window
+            elif move_number == 0:
+                score, _ = self.search_to_depth(position,depth - 1,alpha,beta,ply + 1,move)
             else:
-                # checks for threefold and gets new position key
-                # if no threefold
-                is_rep, key = self.is_threefold_repetition(new_position,path)
-                # runs if we have a repetition
-                if is_rep:
-                    score = 0
-                # runs if no repetition
+                # later moves are first searched with a zero window just above alpha (below beta
+                # for black) which only shows whether the move is better than the best so far
+                if self.use_pvs:
+                    window_alpha, window_beta = (alpha, alpha + NULL_WINDOW) if white else (beta - NULL_WINDOW, beta)
                 else:
-                    new_path = path.copy()
-                    new_path.append(key)
-                    # recursively calls function to eventually get score
-                    score, _ = self.search_to_depth(new_position,depth - 1,new_path,alpha,beta)
+                    window_alpha, window_beta = alpha, beta
+
+                # late move reductions, quiet moves late in the ordering are unlikely to be best so
+                # are searched shallower, apart from in check and moves that give check
+                reduction = 0
+                if (self.use_lmr and depth >= LMR_MIN_DEPTH and move_number >= LMR_MIN_MOVES and not in_check
+                        and not undo[3] and not move & PROMOTION_FLAG and not (undo[2] in ('p','P') and undo[1] == undo[8])
+                        and not position._is_in_check(not white)):
+                    reduction = 1 if move_number < LMR_DEEP_MOVES or depth < LMR_DEEP_DEPTH else 2
+
+                score, _ = self.search_to_depth(position,depth - 1 - reduction,window_alpha,window_beta,ply + 1,move)
+                # searches again at full depth if the reduced search suggests the move is better
+                if reduction and ((score > alpha) if white else (score < beta)):
+                    score, _ = self.search_to_depth(position,depth - 1,window_alpha,window_beta,ply + 1,move)
+                # searches again with the full window if the move is better but not enough for a cutoff
+                if self.use_pvs and alpha < score < beta:
+                    score, _ = self.search_to_depth(position,depth - 1,alpha,beta,ply + 1,move)
+            # takes the move back before looking at the next one
+            self.hash_stack.pop()
+            position.unmake_move(undo)
 
             # runs if white evaluating, so maximising score
-            if position.is_whites_move:
+            if white:
                 if score > best_score:
                     best_score = score
                     best_move = move
@@ -827,14 +1756,327 @@ class Game:
             # avoided by players
             # Can think about alpha and beta as a window of possible scores, like alpha = -1 < beta = 2
             if alpha >= beta:
+                # remembers quiet moves that cause cutoffs to try them early in similar positions
+                if (not undo[3] and not move & PROMOTION_FLAG and not (undo[2] in ('p','P') and undo[1] == undo[8])
+                        and ply < MAX_SEARCH_PLY):
+                    self.update_move_ordering(move,depth,ply,previous_move)
+                if stats is not None:
+                    stats.beta_cutoffs += 1
+                    stats.first_move_cutoffs += move_number == 0
                 break
 
+        # evaluates checkmate and stalemate when there were no legal moves
+        if best_move is None:
+            if stats is not None:
+                stats.leaf_evaluations += 1
+            return position.evaluate(), None
+
+        # stores result, marking whether it is exact or only a bound because of a cutoff
+        if best_score <= alpha_original:
+            bound = UPPER_BOUND
+        elif best_score >= beta_original:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.tt.store(position.zobrist_hash,depth,best_score,bound,best_move)
+
+        if is_root:
+            return best_score, decode_move(best_move)
         return best_score, best_move
     
+    # searches only captures and promotions until the position is quiet. The side to move can
+    # "stand pat" on the static evaluation rather than make a bad capture, and captures that
+    # can't raise the score enough to matter are skipped (delta pruning)
+    def quiescence_search(self,position,alpha,beta):
+        # counts node and periodically checks whether the search has run out of budget
+        self.nodes += 1
+        if self.nodes & 63 == 0 and self.is_search_limit_reached():
+            raise SearchAborted()
+        stats = self.stats
+        if stats is not None:
+            stats.quiescence_nodes += 1
+
+        # checks for 50 move draw
+        if position.half_move_clock >= 100:
+            return 0
+        white = position.is_whites_move
+
+        # when in check every evasion is searched, as standing pat is not an option
+        if position._is_in_check(white):
+            moves = position.get_encoded_moves()
+            # checkmate
+            if moves == []:
+                return float('-inf') if white else float('inf')
+            stand_pat = None
+            best_score = float('-inf') if white else float('inf')
+        else:
+            moves = position.get_encoded_captures()
+            stand_pat = position.static_evaluate()
+            best_score = stand_pat
+            if stats is not None:
+                stats.leaf_evaluations += 1
+            # returns early if standing pat already causes a cutoff, otherwise narrows the window
+            if white:
+                if stand_pat >= beta:
+                    return stand_pat
+                alpha = max(alpha,stand_pat)
+            else:
+                if stand_pat <= alpha:
+                    return stand_pat
+                beta = min(beta,stand_pat)
+
+        for move in self.order_moves(position,moves):
+            # delta pruning, skips captures that could not get back to the window even if the
+            # captured piece came for free
+            if stand_pat is not None:
+                end_sqr = SQUARES[move >> 6 & 63]
+                taken_piece = position.get_piece_at(end_sqr)
+                gain = piece_values[taken_piece.lower()] / 100 if taken_piece else 1
+                if move & PROMOTION_FLAG:
+                    gain += (piece_values[PROMOTION_PIECES[move >> 12 & 3]] - piece_values['p']) / 100
+                if white and stand_pat + gain + DELTA_MARGIN <= alpha:
+                    continue
+                if not white and stand_pat - gain - DELTA_MARGIN >= beta:
+                    continue
+                # skips captures of defended pieces by more valuable pieces, which lose
+                # material straight away
+                if taken_piece and not move & PROMOTION_FLAG:
+                    moving_piece = position.get_piece_at(SQUARES[move & 63]).lower()
+                    if (moving_piece != 'k' and piece_values[moving_piece] > piece_values[taken_piece.lower()]
+                            and position._is_square_attacked(end_sqr,not white)):
+                        continue
+
+            undo, _ = position.make_encoded_move(move)
+            score = self.quiescence_search(position,alpha,beta)
+            position.unmake_move(undo)
+
+            if white:
+                if score > best_score:
+                    best_score = score
+                alpha = max(alpha,best_score)
+            else:
+                if score < best_score:
+                    best_score = score
+                beta = min(beta,best_score)
+            if alpha >= beta:
+                break
+
+        return best_score
+
+    # iterative deepening search, searches depth 1, 2, 3... until max_depth is reached or the
+    # time_limit (seconds) or node_limit runs out. Returns the score and best move of the
+    # deepest completed iteration
+    def search(self,position,max_depth=None,time_limit=None,node_limit=None,start_depth=1,history=None):
+        # sets up limits and move ordering for this search
+        self.root_history = history
+        self.nodes = 0
+        self.pv_moves = {}
+        self.reset_move_ordering()
+        self.completed_depth = 0
+        if self.stats is not None:
+            self.stats.reset()
+        # one table generation per search, so entries from earlier iterations stay preferred
+        self.tt.new_search()
+
+        # plays straight from the opening book when the position is in it
+        book_move = self.get_book_move(position)
+        if book_move is not None:
+            return position.static_evaluate(), book_move
+        # plays the tablebase's best move in endgames it covers
+        tablebase_result = self.get_tablebase_move(position)
+        if tablebase_result is not None:
+            return tablebase_result
+        max_depth = MAX_SEARCH_DEPTH if max_depth is None else max_depth
+        start_time = time.perf_counter()
+        self.limit_start = (start_time, 0)
+
+        # fallback result in case the first iteration is somehow not completed
+        legal_moves = position.get_legal_moves()
+        result = (position.evaluate(), legal_moves[0] if legal_moves else None)
+
+        for depth in range(start_depth, max_depth + 1):
+            # limits are only applied after the first iteration so there is always a searched move
+            if depth == start_depth + 1:
+                self.time_limit = time_limit
+                self.node_limit = node_limit
+            iteration_start = (time.perf_counter(), self.nodes)
+            try:
+                if self.use_aspiration and depth >= 3 and abs(result[0]) != float('inf'):
+                    result = self.aspiration_search(position,depth,result[0])
+                else:
+                    result = self.search_to_depth(position,depth)
+            except SearchAborted:
+                break
+            self.completed_depth = depth
+            # remembers principal variation to search first in the next iteration
+            principal_variation = self.get_principal_variation(position,depth)
+            self.pv_moves = dict(principal_variation)
+            if self.stats is not None:
+                self.stats.iterations.append((depth,time.perf_counter() - iteration_start[0],
+                                              self.nodes - iteration_start[1]))
+            if self.info_callback is not None:
+                self.info_callback(depth,result[0],self.nodes,time.perf_counter() - start_time,
+                                   [decode_move(move) for _, move in principal_variation])
+            # stops if there is a forced mate, only one move, or no time for another iteration
+            if abs(result[0]) == float('inf') or len(legal_moves) == 1 or self.is_search_limit_reached():
+                break
+
+        # clears limits so later searches are not affected
+        self.time_limit = None
+        self.node_limit = None
+        return result
+
+    # searches the position after the opponent's expected reply (ponder_move) while waiting for
+    # them to move. pondering must be set before this is started, and limits are ignored until
+    # ponder_hit is called when the opponent plays the expected move. The search then carries
+    # on as a normal search, or it can be cancelled with stop_event, keeping what it stored in
+    # the transposition table
+    def ponder(self,position,ponder_move,max_depth=None,time_limit=None,node_limit=None):
+        # the expected move extends the game's repeatable positions unless it is irreversible
+        position, irreversible = position.after_move(*ponder_move)
+        history = [position.zobrist_hash] if irreversible else self.repeatable_positions + [position.zobrist_hash]
+        try:
+            return self.search(position,max_depth,time_limit,node_limit,history=history)
+        finally:
+            self.pondering = False
+
+    # turns a ponder search into a normal search, its limits count from now
+    def ponder_hit(self):
+        self.limit_start = (time.perf_counter(), self.nodes)
+        self.pondering = False
+
+    # gets the opponent's expected reply to the move just played from the transposition
+    # table, as a move tuple, or None if there isn't one
+    def get_ponder_move(self,position):
+        line = self.get_principal_variation(position,1)
+        return decode_move(line[0][1]) if line else None
+
+    # searches the root with a narrow window around the previous iteration's score, widening the
+    # window and searching again whenever the score falls outside it
+    def aspiration_search(self,position,depth,previous_score):
+        # bounds are rounded to whole centipawns so a score equal to one compares equal
+        window = ASPIRATION_WINDOW
+        alpha, beta = round(previous_score - window, 2), round(previous_score + window, 2)
+        while True:
+            score, move = self.search_to_depth(position,depth,alpha,beta)
+            if alpha < score < beta:
+                return score, move
+            window *= 4
+            if score <= alpha:
+                alpha = round(previous_score - window, 2) if window <= ASPIRATION_MAX_WINDOW else float('-inf')
+            if score >= beta:
+                beta = round(previous_score + window, 2) if window <= ASPIRATION_MAX_WINDOW else float('inf')
+            # a score outside the widest window is exact
+            if alpha == float('-inf') and score <= alpha or beta == float('inf') and score >= beta:
+                return score, move
+
+    # Lazy SMP, searches the same position in several processes at once. Each process runs its
+    # own iterative deepening search but they share one transposition table, so results found by
+    # one are reused by the others. Half the processes start a ply deeper and every helper has
+    # a different move order so they don't all search the same tree. Once any process finishes
+    # the rest are stopped and the deepest completed result is returned. node_limit applies to
+    # each process. The processes are kept for later searches until close_search_pool is called
+    def smp_search(self,position,max_depth=None,time_limit=None,node_limit=None,processes=None):
+        if processes is None:
+            processes = os.cpu_count() or 1
+        if processes <= 1:
+            return self.search(position,max_depth,time_limit,node_limit)
+        book_move = self.get_book_move(position)
+        if book_move is not None:
+            self.completed_depth = 0
+            return position.static_evaluate(), book_move
+        tablebase_result = self.get_tablebase_move(position)
+        if tablebase_result is not None:
+            self.completed_depth = 0
+            return tablebase_result
+
+        # starts the processes on the first search, or again if the pool no longer fits
+        size_mb = max(1, self.tt.bucket_count * 32 // (1024 * 1024))
+        if self.search_pool is None or (self.search_pool.processes,self.search_pool.size_mb) != (processes,size_mb):
+            self.close_search_pool()
+            self.search_pool = SearchPool(processes,size_mb)
+        # workers start from what the game's table already knows, e.g. from pondering, and the
+        # table is copied back afterwards so their results are kept for the next search
+        self.search_pool.tt.copy_from(self.tt)
+        options = {option: getattr(self,option) for option in SEARCH_OPTIONS}
+        finished = self.search_pool.search((self.tt.generation,position,self.repeatable_positions,options,
+                                            max_depth,time_limit,node_limit),self.stop_event)
+        # the workers' entries are from the next generation, which the game moves on to too
+        self.tt.copy_from(self.search_pool.tt)
+        self.tt.new_search()
+
+        # picks the deepest result, preferring the main worker (lowest id) on ties
+        finished.sort(key=lambda result: (-result[1], result[0]))
+        _, self.completed_depth, score, move, _ = finished[0]
+        self.nodes = sum(result[4] for result in finished)
+        return score, move
+
+    # stops the parallel search processes, if there are any
+    def close_search_pool(self):
+        if self.search_pool is not None:
+            self.search_pool.close()
+            self.search_pool = None
+
+    # gets a move from the opening book, None if there is no book or the position is not in it
+    def get_book_move(self,position):
+        if self.book is None:
+            return None
+        return self.book.choose_move(position)
+
+    # checks if the tablebase covers a position, it needs few enough pieces and no castling rights
+    def can_probe_tablebase(self,position):
+        return (self.tablebase is not None
+                and not (position.K_cq or position.K_ck or position.k_cq or position.k_ck)
+                and position.piece_count() <= self.tablebase.max_pieces)
+
+    # converts a tablebase win/draw/loss for the side to move (2 win, 1 win that the 50 move rule
+    # turns into a draw, 0 draw, -1 loss saved by the 50 move rule, -2 loss) to a score for white
+    def get_tablebase_score(self,wdl,is_whites_move):
+        score = TABLEBASE_WIN_SCORE if wdl == 2 else -TABLEBASE_WIN_SCORE if wdl == -2 else 0.0
+        return score if is_whites_move else -score
+
+    # gets (score, move) from the tablebase for a root position, None if it isn't covered
+    def get_tablebase_move(self,position):
+        if not self.can_probe_tablebase(position):
+            return None
+        result = self.tablebase.probe_root(position)
+        if result is None:
+            return None
+        wdl, move = result
+        return self.get_tablebase_score(wdl,position.is_whites_move), move
+
+    # checks if the current search has used up its time or node budget
+    def is_search_limit_reached(self):
+        if self.stop_event is not None and self.stop_event.is_set():
+            return True
+        if self.pondering:
+            return False
+        start_time, start_nodes = self.limit_start
+        if self.node_limit is not None and self.nodes - start_nodes >= self.node_limit:
+            return True
+        return self.time_limit is not None and time.perf_counter() - start_time >= self.time_limit
+
+    # follows best moves in the transposition table from a position to get the expected line of
+    # play, returns a list of (position hash, encoded move) pairs
+    def get_principal_variation(self,position,max_length):
+        position = position.get_position_copy()
+        line = []
+        seen = set()
+        while len(line) < max_length and position.zobrist_hash not in seen:
+            entry = self.tt.probe(position.zobrist_hash)
+            # stops if there is no stored move, or the stored move is from a hash collision
+            if entry is None or entry[3] not in position.get_encoded_moves():
+                break
+            move = entry[3]
+            seen.add(position.zobrist_hash)
+            line.append((position.zobrist_hash,move))
+            position.make_encoded_move(move)
+        return line
+
     # checks if game is over
     def is_game_over(self):
         # looks for stalemate and checkmate
-        if self.position.get_legal_moves() == []:
+        if self.position.get_encoded_moves() == []:
             return True
         
         # checks for 50 move draw
@@ -844,11 +2086,89 @@ class Game:
         # checks for threefold repetition
         else:
             pos_key = self.get_position_key(self.position)
-            repeatable_positions = self.repeatable_positions
-            # checks list is long enough for their to be a repetition
-            if len(repeatable_positions) >= 7:
-                # checks if there is threefold repetition
-                return repeatable_positions.count(pos_key) >= 3
+            return self.position_counts.get(pos_key, 0) >= 3
 
-        # returns false if these game ending conditions not statisfied
-        return False
+
+# runs one Lazy SMP search process, which searches each task from its queue until it gets None.
+# The shared transposition table is attached by name and each search's result is put on the
+# results queue as (worker_id, completed_depth, score, move, nodes)
+def _smp_worker(worker_id,table_name,size_mb,tasks,stop_event,results):
+    shared_table = shared_memory.SharedMemory(name=table_name)
+    tt = TranspositionTable(size_mb,shared_table.buf)
+    try:
+        for task in iter(tasks.get,None):
+            generation, position, repeatable_positions, options, max_depth, time_limit, node_limit = task
+            # carries on from the game's generation, so every worker's search uses the next one
+            tt.generation = generation
+            # reported if the search fails, so the main process is never left waiting
+            result = (worker_id,0,None,None,0)
+            try:
+                game = Game(tt=tt)
+                game.repeatable_positions = repeatable_positions
+                game.stop_event = stop_event
+                for option, value in options.items():
+                    setattr(game,option,value)
+                # helpers get their own move order, and every other one starts a ply deeper
+                start_depth = 1
+                if worker_id:
+                    game.move_order_seed = worker_id
+                    if worker_id % 2 and (max_depth is None or max_depth > 1):
+                        start_depth = 2
+                score, move = game.search(position,max_depth,time_limit,node_limit,start_depth)
+                result = (worker_id,game.completed_depth,score,move,game.nodes)
+            finally:
+                results.put(result)
+    finally:
+        tt.release()
+        shared_table.close()
+
+
+# class for the Lazy SMP search processes and the shared memory table they search into, kept
+# alive between searches so they are only started once per game. Processes are spawned rather
+# than forked, as forking a process that runs other threads (such as the ui's) can copy locks
+# held at the time and deadlock
+class SearchPool:
+    def __init__(self,processes,size_mb):
+        self.processes = processes
+        self.size_mb = size_mb
+        context = multiprocessing.get_context("spawn")
+        self.shared_table = shared_memory.SharedMemory(create=True,size=size_mb * 1024 * 1024)
+        self.tt = TranspositionTable(size_mb,self.shared_table.buf)
+        self.stop_event = context.Event()
+        self.results = context.Queue()
+        self.tasks = [context.Queue() for _ in range(processes)]
+        self.workers = [context.Process(target=_smp_worker,
+                                        args=(worker_id,self.shared_table.name,size_mb,self.tasks[worker_id],
+                                              self.stop_event,self.results),
+                                        daemon=True)
+                        for worker_id in range(processes)]
+        for worker in self.workers:
+            worker.start()
+
+    # gives every worker the same search task and returns all their results. The rest are
+    # stopped as soon as the first is done, or once the caller's stop_event is set
+    def search(self,task,stop_event=None):
+        self.stop_event.clear()
+        for tasks in self.tasks:
+            tasks.put(task)
+        finished = []
+        while len(finished) < self.processes:
+            try:
+                finished.append(self.results.get(timeout=SMP_POLL_INTERVAL))
+                self.stop_event.set()
+            except queue.Empty:
+                if stop_event is not None and stop_event.is_set():
+                    self.stop_event.set()
+                if not all(worker.is_alive() for worker in self.workers):
+                    raise RuntimeError("a search process exited")
+        return finished
+
+    # stops the workers and frees the shared table
+    def close(self):
+        for tasks in self.tasks:
+            tasks.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.tt.release()
+        self.shared_table.close()
+        self.shared_table.unlink()
@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import shlex
+import sys
+import time
+from multiprocessing import Pool
+
+from src.engine import Game, Position, move_to_uci
+from src.pgn import parse_san
+
+
+# reads an EPD line, which is the first four FEN fields followed by operations such as
+# bm Qxf7+; id "WAC.001"; and returns (position, operations). Operation values are lists of
+# their operands with quotes removed
+def parse_epd(line):
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError(f"not an EPD line: {line}")
+    operations = {}
+    rest = fields[4] if len(fields) > 4 else ""
+    for operation in _split_operations(rest):
+        tokens = shlex.split(operation)
+        if tokens:
+            operations[tokens[0]] = tokens[1:]
+
+    # half move clock and full move number can be given as operations
+    half_move_clock = operations.get("hmvc", ["0"])[0]
+    full_move_number = operations.get("fmvn", ["1"])[0]
+    position = Position.from_fen(" ".join(fields[:4] + [half_move_clock, full_move_number]))
+    return position, operations
+
+# splits EPD operations on semicolons that are not inside quotes
+def _split_operations(text):
+    operations = []
+    current = ""
+    quoted = False
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        if char == ";" and not quoted:
+            operations.append(current.strip())
+            current = ""
+        else:
+            current += char
+    if current.strip():
+        operations.append(current.strip())
+    return operations
+
+# gets an EPD line back from a position and operations
+def to_epd(position,operations):
+    fen_fields = position.to_fen().split()[:4]
+    parts = [" ".join(fen_fields)]
+    for name, operands in operations.items():
+        values = " ".join(f'"{operand}"' if " " in operand or name in ("id", "c0") else operand
+                          for operand in operands)
+        parts.append(f"{name} {values};" if values else f"{name};")
+    return " ".join(parts)
+
+
+# searches one EPD position and returns its result as a dict ready to be written as JSON.
+# Moves are given in UCI notation, and the score is in centipawns for the side to move (or
+# mate, +1 if the side to move mates and -1 if it is mated)
+def analyse_position(job):
+    line_number, line, max_depth, time_limit, node_limit, tt_size_mb = job
+    result = {"line": line_number}
+    try:
+        position, operations = parse_epd(line)
+        result["id"] = operations.get("id", [None])[0]
+        result["fen"] = position.to_fen()
+        best_moves = [move_to_uci(parse_san(position,san)) for san in operations.get("bm", [])]
+        avoid_moves = [move_to_uci(parse_san(position,san)) for san in operations.get("am", [])]
+    except ValueError as error:
+        result["error"] = str(error)
+        return result
+
+    game = Game(tt_size_mb=tt_size_mb)
+    game.set_position(position)
+    start_time = time.perf_counter()
+    score, move = game.search(position,max_depth,time_limit,node_limit)
+    seconds = time.perf_counter() - start_time
+
+    move = move_to_uci(move) if move else None
+    sign = 1 if position.is_whites_move else -1
+    result.update({
+        "move": move,
+        "bm": best_moves,
+        "am": avoid_moves,
+        # solved if the move is one of the best moves and none of the moves to avoid
+        "solved": ((not best_moves or move in best_moves) and move not in avoid_moves
+                   if best_moves or avoid_moves else None),
+        "score_cp": None if abs(score) == float("inf") else round(score * 100) * sign,
+        "mate": (1 if score * sign > 0 else -1) if abs(score) == float("inf") else None,
+        "depth": game.completed_depth,
+        "nodes": game.nodes,
+        "time": round(seconds, 3),
+    })
+    return result
+
+# searches every position in an EPD file, yielding results in the same order as the file.
+# Lines are read as they are needed and only a few positions per process are waiting at once,
+# so files of any length can be run
+def analyse_epd_file(file,max_depth=None,time_limit=None,node_limit=None,processes=1,tt_size_mb=16):
+    jobs = ((line_number,line.strip(),max_depth,time_limit,node_limit,tt_size_mb)
+            for line_number, line in enumerate(file, 1)
+            if line.strip() and not line.startswith("#"))
+    if processes <= 1:
+        for job in jobs:
+            yield analyse_position(job)
+        return
+    with Pool(processes) as pool:
+        pending = []
+        for job in jobs:
+            pending.append(pool.apply_async(analyse_position,(job,)))
+            if len(pending) >= 2 * processes:
+                yield pending.pop(0).get()
+        for result in pending:
+            yield result.get()
+
+
+# command line tool, e.g. python -m src.epd wac.epd --time 1 --output results.jsonl
+def main():
+    parser = argparse.ArgumentParser(description="Searches every position in an EPD file")
+    parser.add_argument("epd",help="EPD file to read")
+    parser.add_argument("--depth",type=int,help="search depth for each position")
+    parser.add_argument("--time",type=float,help="seconds to search each position")
+    parser.add_argument("--nodes",type=int,help="nodes to search each position")
+    parser.add_argument("--processes",type=int,default=os.cpu_count() or 1)
+    parser.add_argument("--hash",type=int,default=16,help="transposition table size in MB")
+    parser.add_argument("--output",help="JSONL file to write results to, standard output if not given")
+    args = parser.parse_args()
+    if args.depth is None and args.time is None and args.nodes is None:
+        parser.error("give at least one of --depth, --time or --nodes")
+
+    output = open(args.output,"w") if args.output else sys.stdout
+    solved = total = 0
+    start_time = time.perf_counter()
+    try:
+        with open(args.epd) as file:
+            for result in analyse_epd_file(file,args.depth,args.time,args.nodes,args.processes,args.hash):
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+                if result.get("solved") is not None:
+                    total += 1
+                    solved += result["solved"]
+    finally:
+        if args.output:
+            output.close()
+    print(f"solved {solved}/{total} in {time.perf_counter() - start_time:.1f}s",file=sys.stderr)
+
+
+# runs our main function
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import argparse
+import time
+from multiprocessing import Pool
+
+from src.engine import Position, decode_move, move_to_uci
+
+
+# standard perft test positions with their known node counts by depth
+REFERENCE_POSITIONS = {
+    "startpos": ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+                 {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609, 6: 119060324}),
+    "kiwipete": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                 {1: 48, 2: 2039, 3: 97862, 4: 4085603, 5: 193690690}),
+    "position3": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+                  {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624, 6: 11030083}),
+    "position4": ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+                  {1: 6, 2: 264, 3: 9467, 4: 422333, 5: 15833292}),
+    "position5": ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+                  {1: 44, 2: 1486, 3: 62379, 4: 2103487, 5: 89941194}),
+    "position6": ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+                  {1: 46, 2: 2079, 3: 89890, 4: 3894594, 5: 164075551}),
+}
+
+
+# counts the leaf nodes of the move tree to a given depth. With bulk counting the last ply is
+# counted from the length of the legal move list rather than by making each move. table is an
+# optional dict of (position hash, depth) -> count that lets transpositions be counted once
+def perft(position,depth,bulk=True,table=None):
+    if depth == 0:
+        return 1
+    if table is not None:
+        count = table.get((position.zobrist_hash,depth))
+        if count is not None:
+            return count
+
+    legal_moves = position.get_encoded_moves()
+    if bulk and depth == 1:
+        count = len(legal_moves)
+    else:
+        count = 0
+        for move in legal_moves:
+            undo, _ = position.make_encoded_move(move)
+            count += perft(position,depth - 1,bulk,table)
+            position.unmake_move(undo)
+
+    if table is not None:
+        table[(position.zobrist_hash,depth)] = count
+    return count
+
+# counts the nodes below each root move, returns a dict of UCI move -> count. Root moves are
+# split across a pool of processes when processes is more than 1, each with its own hash table
+def divide(position,depth,bulk=True,use_hash=False,processes=1):
+    legal_moves = position.get_encoded_moves()
+    if depth < 1:
+        return {}
+    jobs = [(position,move,depth - 1,bulk,use_hash) for move in legal_moves]
+    if processes > 1:
+        with Pool(processes) as pool:
+            counts = pool.map(_count_after_move,jobs)
+    else:
+        counts = [_count_after_move(job) for job in jobs]
+    return {move_to_uci(decode_move(move)): count for move, count in zip(legal_moves,counts)}
+
+# counts the nodes after one root move, run by divide either in process or in the pool
+def _count_after_move(job):
+    position, move, depth, bulk, use_hash = job
+    position = position.get_position_copy()
+    position.make_encoded_move(move)
+    return perft(position,depth,bulk,{} if use_hash else None)
+
+
+# command line tool, e.g. python -m src.perft kiwipete 4 --divide
+def main():
+    parser = argparse.ArgumentParser(description="Counts move generator leaf nodes (perft)")
+    parser.add_argument("position",help="FEN, a reference position name, or 'suite' to check "
+                        "every reference position up to depth")
+    parser.add_argument("depth",type=int)
+    parser.add_argument("--divide",action="store_true",help="print the count below each root move")
+    parser.add_argument("--no-bulk",action="store_true",help="make every move at the last ply")
+    parser.add_argument("--hash",action="store_true",help="count transpositions once")
+    parser.add_argument("--processes",type=int,default=1,help="split root moves across processes")
+    args = parser.parse_args()
+
+    if args.position == "suite":
+        jobs = [(name,fen,depth,expected) for name, (fen, counts) in REFERENCE_POSITIONS.items()
+                for depth, expected in counts.items() if depth <= args.depth]
+    elif args.position in REFERENCE_POSITIONS:
+        fen, counts = REFERENCE_POSITIONS[args.position]
+        jobs = [(args.position,fen,args.depth,counts.get(args.depth))]
+    else:
+        jobs = [(args.position,args.position,args.depth,None)]
+
+    failures = 0
+    for name, fen, depth, expected in jobs:
+        position = Position.from_fen(fen)
+        start_time = time.perf_counter()
+        counts = divide(position,depth,not args.no_bulk,args.hash,args.processes)
+        seconds = time.perf_counter() - start_time
+        if args.divide:
+            for move, count in sorted(counts.items()):
+                print(f"{move}: {count}")
+        total = sum(counts.values())
+        result = "" if expected is None else (" ok" if total == expected else f" FAIL expected {expected}")
+        failures += expected is not None and total != expected
+        print(f"{name} depth {depth}: {total} nodes in {seconds:.2f}s "
+              f"({int(total / seconds) if seconds > 0 else 0} nps){result}")
+    return 1 if failures else 0
+
+
+# runs our main function
+if __name__ == "__main__":
+    raise SystemExit(main())
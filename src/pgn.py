@@ -0,0 +1,244 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from multiprocessing import Pool
+
+from src.engine import Position, move_to_uci, parse_square
+
+
+# FEN of the standard starting position, used unless a game gives its own
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# matches a header line such as [White "Carlsen, Magnus"]
+HEADER_PATTERN = re.compile(r'\[(\w+)\s+"(.*)"\]')
+# matches standard algebraic notation once check and annotation marks have been removed
+SAN_PATTERN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQnbrq]))?$")
+# matches long algebraic notation such as e2e4, e2-e4, Ng1-f3, d7xe8=Q or e7e8q
+LAN_PATTERN = re.compile(r"^([NBRQK])?([a-h][1-8])[-x]?([a-h][1-8])(?:=?([NBRQnbrq]))?$")
+# game results that end the movetext
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+
+# reads games from a PGN file one at a time, yielding (headers, movetext) pairs, so files of
+# any size can be processed without holding more than one game in memory
+def read_games(file):
+    headers = {}
+    movetext = []
+    for line in file:
+        line = line.strip()
+        if line.startswith("["):
+            # a header after movetext starts the next game
+            if movetext:
+                yield headers, " ".join(movetext)
+                headers, movetext = {}, []
+            match = HEADER_PATTERN.match(line)
+            if match:
+                headers[match.group(1)] = match.group(2)
+        elif line and not line.startswith("%"):
+            movetext.append(line)
+    if headers or movetext:
+        yield headers, " ".join(movetext)
+
+# splits movetext into SAN moves, dropping move numbers, comments, variations, NAGs and results
+def get_san_moves(movetext):
+    moves = []
+    depth = 0 # variation nesting
+    # comments can contain anything, so are removed first
+    movetext = re.sub(r"\{[^}]*\}|;[^\n]*", " ", movetext)
+    for token in movetext.replace("(", " ( ").replace(")", " ) ").split():
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth or token in RESULTS or token.startswith("$"):
+            continue
+        else:
+            # strips a move number stuck to the move, e.g. 1.e4 or 12...Nf6
+            token = token.rsplit(".", 1)[-1]
+            if token:
+                moves.append(token)
+    return moves
+
+# gets the position a game starts from
+def get_start_position(headers):
+    return Position.from_fen(headers.get("FEN", START_FEN))
+
+# converts a SAN move to a legal move tuple for the position, raises ValueError if there is
+# no such move or more than one
+def parse_san(position,san):
+    san = san.rstrip("+#!?")
+    legal_moves = position.get_legal_moves()
+
+    # castling is written as the king's side, O-O kingside and O-O-O queenside
+    if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        king_sqr = position.K_position if position.is_whites_move else position.k_position
+        end_sqr = (king_sqr[0], 6 if len(san) == 3 else 2)
+        if (king_sqr,end_sqr) in legal_moves and position.get_piece_at(king_sqr) in ('K','k'):
+            return (king_sqr,end_sqr)
+        raise ValueError(f"illegal castling move: {san}")
+
+    match = SAN_PATTERN.match(san)
+    if not match:
+        raise ValueError(f"not a SAN move: {san}")
+    piece, from_file, from_rank, target, promotion = match.groups()
+    piece = piece or "P"
+    if not position.is_whites_move:
+        piece = piece.lower()
+    end_sqr = (8 - int(target[1]), "abcdefgh".index(target[0]))
+    promotion = promotion.lower() if promotion else None
+
+    candidates = []
+    for move in legal_moves:
+        start_sqr = move[0]
+        if (move[1] != end_sqr or position.get_piece_at(start_sqr) != piece
+                or (from_file and start_sqr[1] != "abcdefgh".index(from_file))
+                or (from_rank and start_sqr[0] != 8 - int(from_rank))
+                or (move[2] if len(move) == 3 else None) != promotion):
+            continue
+        candidates.append(move)
+    if len(candidates) != 1:
+        raise ValueError(f"{'ambiguous' if candidates else 'illegal'} move: {san}")
+    return candidates[0]
+
+# converts a move in long algebraic notation to a legal move tuple for the position, raises
+# ValueError if it is not legal
+def parse_lan(position,lan):
+    match = LAN_PATTERN.match(lan.rstrip("+#!?"))
+    if not match:
+        raise ValueError(f"not a LAN move: {lan}")
+    piece, start, end, promotion = match.groups()
+    start_sqr, end_sqr = parse_square(start), parse_square(end)
+    move = (start_sqr,end_sqr,promotion.lower()) if promotion else (start_sqr,end_sqr)
+    moving_piece = position.get_piece_at(start_sqr)
+    if (move not in position.get_legal_moves()
+            or (piece and (moving_piece is None or moving_piece.upper() != piece))):
+        raise ValueError(f"illegal move: {lan}")
+    return move
+
+# converts a move in either standard or long algebraic notation to a legal move tuple
+def parse_move(position,text):
+    if LAN_PATTERN.match(text.rstrip("+#!?")):
+        return parse_lan(position,text)
+    return parse_san(position,text)
+
+# replays a game's moves through the legal move generator, yielding (position, move) before
+# each move is made. Moves can be standard or long algebraic notation. The position is changed
+# in place as moves are made, so copy it to keep it. Stops after max_plies moves
+def replay_game(headers,movetext,max_plies=None):
+    position = get_start_position(headers)
+    for ply, text in enumerate(get_san_moves(movetext)):
+        if max_plies is not None and ply >= max_plies:
+            break
+        move = parse_move(position,text)
+        yield position, move
+        position.make_move(*move)
+
+# converts a game's moves to long algebraic notation, e.g. ["e2e4", "e7e5"]
+def get_uci_moves(headers,movetext):
+    return [move_to_uci(move) for _, move in replay_game(headers,movetext)]
+
+# replays a batch of games, returning a result dict for each. A game with an illegal or
+# unreadable move gets an error and the number of plies before it
+def replay_batch(batch):
+    games, include_moves = batch
+    results = []
+    for headers, movetext in games:
+        result = {"white": headers.get("White"), "black": headers.get("Black"),
+                  "result": headers.get("Result")}
+        moves = []
+        try:
+            for _, move in replay_game(headers,movetext):
+                moves.append(move)
+        except ValueError as error:
+            result["error"] = str(error)
+        result["plies"] = len(moves)
+        if include_moves:
+            result["moves"] = [move_to_uci(move) for move in moves]
+        results.append(result)
+    return results
+
+# replays every game in some PGN files, yielding results in file order. Games are read lazily
+# and sent to a pool of processes in batches, with only a few batches waiting at once
+def replay_pgn_files(pgn_paths,processes=1,games_per_batch=200,include_moves=False):
+    def batches():
+        batch = []
+        for pgn_path in pgn_paths:
+            with open(pgn_path,encoding="utf-8",errors="replace") as file:
+                for game in read_games(file):
+                    batch.append(game)
+                    if len(batch) == games_per_batch:
+                        yield batch, include_moves
+                        batch = []
+        if batch:
+            yield batch, include_moves
+
+    if processes <= 1:
+        for batch in batches():
+            yield from replay_batch(batch)
+        return
+    with Pool(processes) as pool:
+        pending = []
+        for batch in batches():
+            pending.append(pool.apply_async(replay_batch,(batch,)))
+            if len(pending) >= 2 * processes:
+                yield from pending.pop(0).get()
+        for result in pending:
+            yield from result.get()
+
+
+# class for counting replayed games and plies and reporting how fast they are going
+class ReplayCounter:
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.games = 0
+        self.plies = 0
+        self.errors = 0
+
+    # counts one game's result
+    def add(self,result):
+        self.games += 1
+        self.plies += result["plies"]
+        self.errors += "error" in result
+
+    # gets a one line summary with games and plies per second
+    def summary(self):
+        seconds = max(time.perf_counter() - self.start_time, 1e-9)
+        return (f"{self.games} games ({self.errors} with errors), {self.plies} plies in {seconds:.1f}s: "
+                f"{self.games / seconds:.1f} games/s, {self.plies / seconds:.0f} plies/s")
+
+
+# command line tool, e.g. python -m src.pgn games.pgn --output games.jsonl
+def main():
+    parser = argparse.ArgumentParser(description="Replays and checks every game in PGN files")
+    parser.add_argument("pgn",nargs="+",help="PGN files to read")
+    parser.add_argument("--processes",type=int,default=os.cpu_count() or 1)
+    parser.add_argument("--games-per-batch",type=int,default=200)
+    parser.add_argument("--moves",action="store_true",help="include each game's moves in UCI notation")
+    parser.add_argument("--output",help="JSONL file to write one result per game to")
+    parser.add_argument("--progress",type=float,default=5.0,help="seconds between progress reports")
+    args = parser.parse_args()
+
+    counter = ReplayCounter()
+    output = open(args.output,"w") if args.output else None
+    last_report = time.perf_counter()
+    try:
+        for result in replay_pgn_files(args.pgn,args.processes,args.games_per_batch,args.moves):
+            counter.add(result)
+            if output:
+                output.write(json.dumps(result) + "\n")
+            if time.perf_counter() - last_report >= args.progress:
+                print(counter.summary(),file=sys.stderr)
+                last_report = time.perf_counter()
+    finally:
+        if output:
+            output.close()
+    print(counter.summary())
+    return 1 if counter.errors else 0
+
+
+# runs our main function
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,78 @@
+import os
+
+# python-chess is optional, it is only needed to probe tablebases
+try:
+    import chess
+    import chess.syzygy
+except ImportError:
+    chess = None
+
+
+# class for probing Syzygy endgame tablebases in local directories, using python-chess to read
+# the table files. Table files are found up front but each one is only opened and memory-mapped
+# the first time a position needs it. Pass it to Game.tablebase to use it in search
+class SyzygyTablebase:
+    def __init__(self,directories):
+        if chess is None:
+            raise ImportError("Syzygy tablebases need python-chess, install it with pip install chess")
+        # directories can be a list or a string split like PATH
+        if isinstance(directories, str):
+            directories = directories.split(os.pathsep)
+        self.tablebase = chess.syzygy.Tablebase()
+        for directory in directories:
+            self.tablebase.add_directory(directory)
+        # most pieces (kings included) in any table found, table names look like KRPvKR
+        self.max_pieces = max((len(name) - 1 for name in self.tablebase.wdl), default=0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc_info):
+        self.close()
+
+    # closes every open table file
+    def close(self):
+        self.tablebase.close()
+
+    # gets the python-chess board for a position
+    def _get_board(self,position):
+        return chess.Board(position.to_fen())
+
+    # gets the win/draw/loss value for the side to move: 2 win, 1 win that the 50 move rule
+    # turns into a draw, 0 draw, -1 loss saved by the 50 move rule, -2 loss. None if no table
+    # covers the position
+    def probe_wdl(self,position):
+        return self.tablebase.get_wdl(self._get_board(position))
+
+    # picks the best move for a position using the distance to zeroing (DTZ) tables, returns
+    # (wdl, move) or None if no table covers it. Mates are played first, then moves that keep
+    # the best result, winning by resetting the 50 move count as soon as possible and losing
+    # as slowly as possible
+    def probe_root(self,position):
+        board = self._get_board(position)
+        if self.tablebase.get_wdl(board) is None:
+            return None
+        best_key = best_move = None
+        position = position.get_position_copy()
+        for move in position.get_legal_moves():
+            undo, _ = position.make_move(*move)
+            board = self._get_board(position)
+            is_mate = board.is_checkmate()
+            child_wdl = self.tablebase.get_wdl(board)
+            child_dtz = self.tablebase.get_dtz(board)
+            zeroing = position.half_move_clock == 0
+            position.unmake_move(undo)
+            if child_wdl is None or child_dtz is None:
+                return None
+            wdl = -child_wdl
+            if wdl > 0:
+                key = (wdl, is_mate, zeroing, -abs(child_dtz))
+            elif wdl < 0:
+                key = (wdl, False, False, abs(child_dtz))
+            else:
+                key = (wdl, False, False, 0)
+            if best_key is None or key > best_key:
+                best_key, best_move = key, move
+        if best_move is None:
+            return None
+        return best_key[0], best_move
@@ -0,0 +1,199 @@
+import sys
+import threading
+
+from src.book import PolyglotBook
+from src.engine import Game, Position, MAX_SEARCH_DEPTH, move_to_uci, uci_to_move
+
+
+# FEN of the standard starting position
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# moves assumed to be left in the game when the GUI gives a clock without movestogo
+DEFAULT_MOVES_TO_GO = 30
+# most search processes the Threads option allows
+MAX_THREADS = 64
+
+
+# class that speaks the UCI protocol, reading commands from a GUI and writing replies. The
+# search runs on its own thread so commands like stop and isready are answered straight away
+class UCIEngine:
+    def __init__(self,output=sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock() # search thread and command thread both write
+        self.hash_mb = 16
+        self.threads = 1 # search processes, more than one runs the parallel search
+        self.book = None # PolyglotBook set by the BookFile option
+        self.game = Game(tt_size_mb=self.hash_mb)
+        self.game.info_callback = self.send_info
+        self.search_thread = None
+        self.stop_event = threading.Event()
+        self.infinite = False # an infinite search only sends bestmove after stop
+
+    # writes one line to the GUI
+    def send(self,line):
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    # handles one command line, returns False once the engine should quit
+    def handle_command(self,line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+
+        if command == "uci":
+            self.send("id name BasicCarp")
+            self.send("id author tom-will-code")
+            self.send(f"option name Hash type spin default {self.hash_mb} min 1 max 4096")
+            self.send("option name BookFile type string default <empty>")
+            self.send(f"option name Threads type spin default 1 min 1 max {MAX_THREADS}")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stop_search()
+            self.game.tt.clear()
+            self.game.set_position(Position.from_fen(START_FEN))
+        elif command == "setoption":
+            self.set_option(args)
+        elif command == "position":
+            self.stop_search()
+            self.set_position(args)
+        elif command == "go":
+            self.stop_search()
+            self.go(args)
+        elif command == "stop":
+            self.stop_search()
+        elif command == "quit":
+            self.stop_search()
+            self.game.close_search_pool()
+            return False
+        return True
+
+    # handles "setoption name <name> value <value>"
+    def set_option(self,args):
+        if "name" not in args or "value" not in args:
+            return
+        name = " ".join(args[args.index("name") + 1:args.index("value")]).lower()
+        value = " ".join(args[args.index("value") + 1:])
+        if name == "hash":
+            self.stop_search()
+            self.hash_mb = max(1, int(value))
+            info_callback = self.game.info_callback
+            self.game.close_search_pool()
+            self.game = Game(tt_size_mb=self.hash_mb)
+            self.game.info_callback = info_callback
+            self.game.book = self.book
+        elif name == "bookfile":
+            self.stop_search()
+            if self.book is not None:
+                self.book.close()
+            self.book = None if value in ("", "<empty>") else PolyglotBook(value)
+            self.game.book = self.book
+        elif name == "threads":
+            self.stop_search()
+            self.threads = max(1, min(MAX_THREADS, int(value)))
+
+    # handles "position startpos|fen <fen> [moves <move> ...]"
+    def set_position(self,args):
+        if "moves" in args:
+            moves = args[args.index("moves") + 1:]
+            args = args[:args.index("moves")]
+        else:
+            moves = []
+        if args and args[0] == "fen":
+            position = Position.from_fen(" ".join(args[1:]))
+        else:
+            position = Position.from_fen(START_FEN)
+        self.game.set_position(position)
+        for text in moves:
+            self.game.make_move(*uci_to_move(text))
+
+    # handles "go" with depth, movetime, wtime/btime (plus increments and movestogo), nodes
+    # or infinite, and starts the search thread
+    def go(self,args):
+        options = {}
+        index = 0
+        while index < len(args):
+            if args[index] == "infinite":
+                options["infinite"] = True
+                index += 1
+            elif index + 1 < len(args):
+                options[args[index]] = args[index + 1]
+                index += 2
+            else:
+                index += 1
+
+        max_depth = int(options["depth"]) if "depth" in options else None
+        node_limit = int(options["nodes"]) if "nodes" in options else None
+        time_limit = self.get_time_limit(options)
+        self.infinite = "infinite" in options
+
+        self.stop_event.clear()
+        self.game.stop_event = self.stop_event
+        self.search_thread = threading.Thread(
+            target=self.search_worker,
+            args=(max_depth or MAX_SEARCH_DEPTH, time_limit, node_limit),
+            daemon=True
+        )
+        self.search_thread.start()
+
+    # works out how many seconds to search for from the go options, None for no time limit
+    def get_time_limit(self,options):
+        if "movetime" in options:
+            return int(options["movetime"]) / 1000
+        white = self.game.position.is_whites_move
+        clock = options.get("wtime" if white else "btime")
+        if clock is None or "infinite" in options:
+            return None
+        time_left = int(clock) / 1000
+        increment = int(options.get("winc" if white else "binc", 0)) / 1000
+        moves_to_go = int(options.get("movestogo", DEFAULT_MOVES_TO_GO))
+        # spends an even share of the clock plus most of the increment, never more than half
+        # of what is left
+        return max(0.01, min(time_left / max(1, moves_to_go) + increment * 0.8, time_left / 2))
+
+    # runs a search and reports the best move, on the search thread. With one thread this is
+    # the normal search, otherwise the parallel one, which sends no info lines
+    def search_worker(self,max_depth,time_limit,node_limit):
+        score, move = self.game.smp_search(self.game.position,max_depth,time_limit,node_limit,self.threads)
+        # an infinite search must wait for stop before giving its move
+        if self.infinite:
+            self.stop_event.wait()
+        self.send("bestmove " + (move_to_uci(move) if move else "0000"))
+
+    # stops any running search and waits for it to send its best move
+    def stop_search(self):
+        if self.search_thread is not None:
+            self.stop_event.set()
+            self.search_thread.join()
+            self.search_thread = None
+
+    # info callback for the search, sends depth, score, nodes, speed and principal variation
+    def send_info(self,depth,score,nodes,seconds,principal_variation):
+        # UCI scores are from the side to move's point of view
+        sign = 1 if self.game.position.is_whites_move else -1
+        if abs(score) == float('inf'):
+            mate_in = max(1, (len(principal_variation) + 1) // 2)
+            score_text = f"mate {mate_in if score * sign > 0 else -mate_in}"
+        else:
+            score_text = f"cp {round(score * 100) * sign}"
+        nps = int(nodes / seconds) if seconds > 0 else 0
+        self.send(f"info depth {depth} score {score_text} nodes {nodes} nps {nps} "
+                  f"time {int(seconds * 1000)} pv {' '.join(move_to_uci(move) for move in principal_variation)}")
+
+
+# reads commands from stdin until quit
+def main():
+    engine = UCIEngine()
+    for line in sys.stdin:
+        if not engine.handle_command(line):
+            break
+    engine.stop_search()
+    engine.game.close_search_pool()
+
+
+# runs our main function
+if __name__ == "__main__":
+    main()
@@ -36,6 +36,10 @@ def main():
     engine_thread = [None]
     engine_thinking = [False]
     engine_result = [None]
+    # Flags for pondering, searching the player's expected reply while they think
+    ponder_thread = [None]
+    ponder_move = [None] # reply being pondered on
+    ponder_result = [None]
 
     # Loads font for text and creates text surfaces
     font = pg.font.Font("assets/fonts/Roboto/static/Roboto-Medium.ttf",22)
@@ -94,24 +98,65 @@ def main():
     # Define functions
     # ---------------------------------------------------------
     
-    # used to call engine for search 
-    def engine_worker(game, depth):
-        score, move = game.search_to_depth(game.position, depth)
+    # used to call engine for search, the search runs in a process per core. The processes are
+    # started on the first search and kept until the window is closed
+    def engine_worker(game, time_limit):
+        score, move = game.smp_search(game.position, time_limit=time_limit)
         engine_result[0] = move
         engine_thinking[0] = False
     
-    # starts engine thread if engine is not thinking
-    def start_engine_search(game, depth=4):
+    # starts engine thread if engine is not thinking, the engine searches deeper and deeper
+    # until time_limit seconds have passed
+    def start_engine_search(game, time_limit=3):
         if not engine_thinking[0]:
             engine_thinking[0] = True
             engine_result[0] = None
+            # lets the search be stopped if the window is closed
+            game.stop_event = threading.Event()
             engine_thread[0] = threading.Thread(
                 target=engine_worker,
-                args=(game, depth),
+                args=(game, time_limit),
                 daemon=True
             )
             engine_thread[0].start()
 
+    # used to search on the player's time, the search runs in this process so a ponder hit
+    # can turn it into the engine's search
+    def ponder_worker(game, position, move, time_limit):
+        score, result = game.ponder(position, move, time_limit=time_limit)
+        ponder_result[0] = result
+
+    # starts pondering on the reply the engine expects after its move, if it has one
+    def start_pondering(game, time_limit=3):
+        move = game.get_ponder_move(game.position)
+        if move is None:
+            return
+        ponder_move[0] = move
+        ponder_result[0] = None
+        game.stop_event = threading.Event()
+        # set before the thread starts so a quick reply can't be missed
+        game.pondering = True
+        ponder_thread[0] = threading.Thread(
+            target=ponder_worker,
+            args=(game, game.position.get_position_copy(), move, time_limit),
+            daemon=True
+        )
+        ponder_thread[0].start()
+
+    # called after the player moves. If they played the expected reply the ponder search
+    # carries on as the engine's search, otherwise it is stopped, keeping what it found in
+    # the transposition table
+    def end_pondering(game, move):
+        if ponder_thread[0] is None:
+            return
+        if move == ponder_move[0] and not game.is_game_over():
+            game.ponder_hit()
+        else:
+            game.stop_event.set()
+            ponder_thread[0].join()
+            ponder_thread[0] = None
+            game.stop_event = None
+
 
     # Creates the chess board background surface
     def create_board_surface(): 
@@ -283,6 +328,7 @@ def main():
                             else:
                                 # makes move
                                 game.make_move(initial_piece_position,clicked_square)
+                                end_pondering(game, (initial_piece_position,clicked_square))
                                 # updates ui state
                                 if game.is_game_over():
                                     ui_state = UIstate.GAME_OVER
@@ -324,6 +370,9 @@ def main():
 
                         # changes ui_state if move is made
                         if old_turn != new_turn:
+                            # gets the piece promoted to from the board
+                            promoted_piece = game.position.get_piece_at(prom_square).lower()
+                            end_pondering(game, (init_square,prom_square,promoted_piece))
                             # updates ui state
                             if game.is_game_over():
                                 ui_state = UIstate.GAME_OVER
@@ -358,6 +407,13 @@ def main():
                     ui_state = UIstate.GAME_OVER
                 else:
                     ui_state = UIstate.PlAYERS_MOVE
+                    start_pondering(game)
+            # waits for the ponder search if the player made the expected move
+            elif ponder_thread[0] is not None:
+                if not ponder_thread[0].is_alive():
+                    engine_result[0] = ponder_result[0]
+                    ponder_thread[0] = None
+                    game.stop_event = None
             # starts engine search if not already started
             else:
                 start_engine_search(game)
@@ -403,6 +459,14 @@ def main():
         # Limits fps to 60
         clock.tick(60)
     
+    # stops any search still running and the search processes
+    if game.stop_event is not None:
+        game.stop_event.set()
+    for thread in (engine_thread[0], ponder_thread[0]):
+        if thread is not None:
+            thread.join()
+    game.close_search_pool()
+
     # Quits game once loop is exited
     pg.quit()
 
@@ -0,0 +1,16 @@
+import copy
+
+from src.bench import run_bench, compare_results
+
+
+# checks a small benchmark run is reproducible and a slower run is reported as a regression
+def test_bench_regression_report():
+    results = run_bench(search_depth=2,perft_depth=2)
+    assert results["signature"] == run_bench(search_depth=2,perft_depth=2)["signature"]
+    assert compare_results(results,results) == []
+    slower = copy.deepcopy(results)
+    slower["phases"]["search"]["nps"] = results["phases"]["search"]["nps"] // 2
+    assert len(compare_results(slower,results,threshold=10)) == 1
+    changed = copy.deepcopy(results)
+    changed["signature"] += 1
+    assert compare_results(changed,results)[0].startswith("signature changed")
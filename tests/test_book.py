@@ -0,0 +1,84 @@
+from src import book_builder
+from src.book import PolyglotBook, POLYGLOT_ENTRY, polyglot_key, encode_polyglot_move, decode_polyglot_move
+from src.engine import Game, Position
+from tests.test_legal_moves import kiwipete_board
+
+
+# writes a book file from (position, move, weight) entries, sorted by key as Polyglot requires
+def write_book(path,entries):
+    records = sorted((polyglot_key(position),encode_polyglot_move(position,move),weight)
+                     for position, move, weight in entries)
+    with open(path,"wb") as file:
+        for key, code, weight in records:
+            file.write(POLYGLOT_ENTRY.pack(key,code,weight,0))
+
+# checks keys against the values published with the Polyglot format
+def test_polyglot_key():
+    position = Position.from_fen("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+    assert polyglot_key(position) == 0x463b96181691fc9c
+    position.make_move((6,4),(4,4))
+    assert polyglot_key(position) == 0x823c9b50fd114196
+    position.make_move((1,3),(3,3))
+    position.make_move((4,4),(3,4))
+    position.make_move((1,5),(3,5))
+    assert polyglot_key(position) == 0x22a48b5a8e47ff78
+
+# checks castling is written as the king taking its rook and read back as the king's move
+def test_polyglot_castling_move():
+    position = Position(kiwipete_board)
+    code = encode_polyglot_move(position,((7,4),(7,6)))
+    assert code == 0b000_100_000_111
+    assert decode_polyglot_move(position,code) == ((7,4),(7,6))
+
+# checks the game plays book moves by weight and searches once out of book
+def test_game_uses_book(tmp_path):
+    start = Position.from_fen("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+    after_e4 = start.get_position_copy()
+    after_e4.make_move((6,4),(4,4))
+    path = tmp_path / "book.bin"
+    write_book(path,[(start,((6,4),(4,4)),10),(start,((6,3),(4,3)),5),(after_e4,((1,2),(3,2)),1)])
+
+    with PolyglotBook(path,weighted_random=False) as book:
+        assert len(book) == 3
+        assert book.find_entries(start) == [(((6,4),(4,4)),10),(((6,3),(4,3)),5)]
+        game = Game()
+        game.book = book
+        assert game.search(game.position,max_depth=3) == (game.position.static_evaluate(),((6,4),(4,4)))
+        game.make_move((6,4),(4,4))
+        assert game.search(game.position,max_depth=3)[1] == ((1,2),(3,2))
+        game.make_move((1,2),(3,2))
+        game.search(game.position,max_depth=2)
+        assert game.completed_depth == 2
+    with PolyglotBook(path,seed=1) as book:
+        assert {book.choose_move(start) for _ in range(50)} == {((6,4),(4,4)),((6,3),(4,3))}
+
+# checks the builder merges counts from several runs into a book the reader can use
+def test_build_book(tmp_path,monkeypatch):
+    monkeypatch.setattr(book_builder,"MERGE_FAN_IN",2)
+    pgn_path = tmp_path / "games.pgn"
+    pgn_path.write_text('[Result "1-0"]\n\n1. e4 e5 2. Nf3 1-0\n\n'
+                        '[Result "0-1"]\n\n1. e4 c5 0-1\n\n'
+                        '[Result "1/2-1/2"]\n\n1. d4 d5 1/2-1/2\n\n'
+                        '[Result "*"]\n\n1. c4 *\n\n'
+                        '[Result "1-0"]\n\n1. e4 e5 1-0\n')
+    output_path = tmp_path / "book.bin"
+    assert book_builder.build_book([pgn_path],output_path,max_plies=2,min_games=1,games_per_run=1) == (4,5)
+    start = Position.from_fen("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+    with PolyglotBook(output_path) as book:
+        # e4 won twice and lost once, d4 was drawn, c4 has no result
+        assert book.find_entries(start) == [(((6,4),(4,4)),4),(((6,3),(4,3)),1)]
+        start.make_move((6,4),(4,4))
+        # weights are from black's side after 1. e4
+        assert book.find_entries(start) == [(((1,2),(3,2)),2),(((1,4),(3,4)),0)]
+
+# checks a move repeated within one game counts as one game towards min_games
+def test_build_book_counts_games(tmp_path):
+    pgn_path = tmp_path / "games.pgn"
+    pgn_path.write_text('[Result "1-0"]\n\n1. Nf3 Nf6 2. Ng1 Ng8 3. Nf3 Nf6 4. Ng1 Ng8 1-0\n\n'
+                        '[Result "0-1"]\n\n1. e4 e5 0-1\n')
+    output_path = tmp_path / "book.bin"
+    assert book_builder.build_book([pgn_path],output_path,max_plies=8,min_games=2) == (2,0)
+    assert book_builder.build_book([pgn_path],output_path,max_plies=8,min_games=1) == (2,6)
+    start = Position.from_fen("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+    with PolyglotBook(output_path) as book:
+        assert book.find_entries(start) == [(((7,6),(5,5)),2),(((6,4),(4,4)),0)]
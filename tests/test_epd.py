@@ -0,0 +1,38 @@
+import io
+
+import pytest
+
+from src.engine import Position
+from src.epd import parse_epd, to_epd, analyse_epd_file
+
+
+EPD_TEXT = """6k1/5ppp/8/8/8/8/8/R5K1 w - - bm Ra8#; id "back rank";
+r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5Q2/PPPP1PPP/RNB1K1NR w KQkq - bm Qxf7#; id "scholar's mate";
+not an epd line
+4k3/8/8/8/8/8/4P3/4K3 w - - am Kd1; hmvc 7; id "pawn ending";
+"""
+
+# checks EPD operations are read, including quoted values and the half move clock
+def test_parse_epd():
+    position, operations = parse_epd('4k3/8/8/8/8/8/4P3/4K3 w - - am Kd1; hmvc 7; id "pawn; ending";')
+    assert operations == {"am": ["Kd1"], "hmvc": ["7"], "id": ["pawn; ending"]}
+    assert position.half_move_clock == 7
+    assert to_epd(position,operations) == '4k3/8/8/8/8/8/4P3/4K3 w - - am Kd1; hmvc 7; id "pawn; ending";'
+
+# checks a FEN missing required fields is rejected with ValueError rather than IndexError
+@pytest.mark.parametrize("fen",["","4k3/8/8/8/8/8/4P3/4K3","4k3/8/8/8/8/8/4P3/4K3 w"])
+def test_short_fen(fen):
+    with pytest.raises(ValueError):
+        Position.from_fen(fen)
+
+# checks results come back in file order with the same values whether or not a pool is used
+def test_analyse_epd_file():
+    results = list(analyse_epd_file(io.StringIO(EPD_TEXT),max_depth=2))
+    assert [result["line"] for result in results] == [1,2,3,4]
+    assert [result.get("solved") for result in results] == [True,True,None,True]
+    assert results[0]["move"] == "a1a8" and results[0]["mate"] == 1
+    assert "error" in results[2]
+    pooled = list(analyse_epd_file(io.StringIO(EPD_TEXT),max_depth=2,processes=2))
+    for result in results + pooled:
+        result.pop("time",None)
+    assert pooled == results
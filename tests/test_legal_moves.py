@@ -1,4 +1,4 @@
-from src.engine import Game
+from src.engine import Game, Position, encode_move, decode_move
 
 
 # perft test
@@ -8,11 +8,36 @@ def count_nodes_at_depth(position,depth):
 
     node_count = 0
     for move in position.get_legal_moves():
-        new_position, _ = position.after_move(*move)
-        node_count += count_nodes_at_depth(new_position,depth - 1)
+        undo, _ = position.make_move(*move)
+        node_count += count_nodes_at_depth(position,depth - 1)
+        position.unmake_move(undo)
     
     return node_count
 
+# "Kiwipete" position, exercises castling, en passant and promotions
+kiwipete_board = [
+    ["r",None,None,None,"k",None,None,"r"],
+    ["p",None,"p","p","q","p","b",None],
+    ["b","n",None,None,"p","n","p",None],
+    [None,None,None,"P","N",None,None,None],
+    [None,"p",None,None,"P",None,None,None],
+    [None,None,"N",None,None,"Q",None,"p"],
+    ["P","P","P","B","B","P","P","P"],
+    ["R",None,None,None,"K",None,None,"R"]
+    ]
+
+# perft "position 3", exercises pins, checks and en passant along a rank with the king on it
+position_3_board = [
+    [None]*8,
+    [None,None,"p",None,None,None,None,None],
+    [None,None,None,"p",None,None,None,None],
+    ["K","P",None,None,None,None,None,"r"],
+    [None,"R",None,None,None,"p",None,"k"],
+    [None]*8,
+    [None,None,None,None,"P",None,"P",None],
+    [None]*8
+    ]
+
 # checks we have correct number of terminal nodes in engine search tree
 def test_start_position():
     game = Game() 
@@ -22,5 +47,48 @@ def test_start_position():
     assert count_nodes_at_depth(game.position,4) == 197281
     print("All tests passed!")
 
+# checks a position with every special move
+def test_kiwipete():
+    game = Game(kiwipete_board)
+    assert count_nodes_at_depth(game.position,1) == 48
+    assert count_nodes_at_depth(game.position,2) == 2039
+    assert count_nodes_at_depth(game.position,3) == 97862
+
+# checks the king is exposed to pins and discovered checks
+def test_position_3():
+    position = Position([row[:] for row in position_3_board],K_position=(3,0),k_position=(4,7),
+                        K_cq=False,K_ck=False,k_cq=False,k_ck=False)
+    assert count_nodes_at_depth(position,1) == 14
+    assert count_nodes_at_depth(position,2) == 191
+    assert count_nodes_at_depth(position,3) == 2812
+    assert count_nodes_at_depth(position,4) == 43238
 
+# gets everything that describes a position, for comparing before and after a move
+def position_state(position):
+    return (position.get_board_copy(),position.is_whites_move,position.K_position,position.k_position,
+            position.K_cq,position.K_ck,position.k_cq,position.k_ck,
+            position.en_passant_target,position.half_move_clock,position.zobrist_hash,
+            position.midgame_score,position.endgame_score,position.phase,position.pieces)
+
+# checks unmake_move restores the position exactly and matches after_move
+def test_make_unmake_restores_position():
+    position = Game(kiwipete_board).position
+    before = position_state(position)
+    for move in position.get_legal_moves():
+        copied_position, _ = position.after_move(*move)
+        undo, _ = position.make_move(*move)
+        assert position_state(position) == position_state(copied_position)
+        # checks the incrementally updated hash and evaluation match ones built from scratch
+        assert position.zobrist_hash == position._compute_hash()
+        assert (position.midgame_score,position.endgame_score,position.phase) == position._compute_eval_state()
+        assert position.piece_count() == 64 - sum(row.count(None) for row in position.board)
+        position.unmake_move(undo)
+        assert position_state(position) == before
 
+# checks encoded moves convert to and from the tuples
+def test_encoded_moves():
+    position = Game(kiwipete_board).position
+    codes = position.get_encoded_moves()
+    assert [decode_move(code) for code in codes] == position.get_legal_moves()
+    assert all(encode_move(decode_move(code)) == code < 1 << 16 for code in codes)
+    assert not hasattr(position,'__dict__')
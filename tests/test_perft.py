@@ -0,0 +1,18 @@
+from src.engine import Position
+from src.perft import REFERENCE_POSITIONS, perft, divide
+
+
+# checks every reference position against its known counts at a shallow depth
+def test_reference_positions():
+    for fen, counts in REFERENCE_POSITIONS.values():
+        assert perft(Position.from_fen(fen),3) == counts[3]
+
+# checks bulk counting, the hash table and the process pool all give the same totals
+def test_perft_options_agree():
+    fen, counts = REFERENCE_POSITIONS["position4"]
+    position = Position.from_fen(fen)
+    assert perft(position,3,bulk=False) == counts[3]
+    assert perft(position,3,table={}) == counts[3]
+    in_process = divide(position,3,use_hash=True)
+    assert in_process == divide(position,3,processes=2)
+    assert sum(in_process.values()) == counts[3]
@@ -0,0 +1,67 @@
+import io
+
+import pytest
+
+from src.engine import Position
+from src.pgn import read_games, get_san_moves, parse_san, parse_lan, get_uci_moves, replay_pgn_files
+
+
+# two games with comments, variations, NAGs, castling, a promotion and a FEN start
+PGN_TEXT = """[Event "Test"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 {a comment (not a variation)} Nc6 3. Bb5 a6 (3... Nf6 4. O-O) 4. Ba4 $1 Nf6
+5. O-O Be7 1-0
+
+[Event "Promotion"]
+[SetUp "1"]
+[FEN "8/P6k/8/8/8/8/8/K7 w - - 0 1"]
+[Result "*"]
+
+1. a8=Q+ Kg6 *
+"""
+
+# checks games are split and their moves read in order
+def test_read_games():
+    games = list(read_games(io.StringIO(PGN_TEXT)))
+    assert len(games) == 2
+    assert games[0][0]["Result"] == "1-0"
+    assert get_san_moves(games[0][1]) == ["e4","e5","Nf3","Nc6","Bb5","a6","Ba4","Nf6","O-O","Be7"]
+    assert get_uci_moves(*games[0])[-2:] == ["e1g1","f8e7"]
+    assert get_uci_moves(*games[1]) == ["a7a8q","h7g6"]
+
+# checks castling and disambiguation
+def test_parse_san():
+    assert parse_san(Position.from_fen("4k3/8/8/8/8/8/8/R3K2R w KQ - 0 1"),"O-O-O") == ((7,4),(7,2))
+    position = Position.from_fen("4k3/8/8/8/8/8/4K3/R6R w - - 0 1")
+    assert parse_san(position,"Rad1") == ((7,0),(7,3))
+
+# checks ambiguous and illegal moves are rejected
+@pytest.mark.parametrize("san",["Rd1","Rb8","Nf3"])
+def test_parse_san_rejects(san):
+    with pytest.raises(ValueError):
+        parse_san(Position.from_fen("4k3/8/8/8/8/8/4K3/R6R w - - 0 1"),san)
+
+# checks long algebraic moves, with or without the piece letter and separators
+def test_parse_lan():
+    position = Position.from_fen("4k3/1P6/8/8/8/8/8/R3K1N1 w Q - 0 1")
+    assert parse_lan(position,"e1c1") == ((7,4),(7,2))
+    assert parse_lan(position,"Ng1-f3") == ((7,6),(5,5))
+    assert parse_lan(position,"b7b8=N") == ((1,1),(0,1),'n')
+
+# checks a wrong piece letter and an illegal move are rejected
+@pytest.mark.parametrize("lan",["Bg1f3","e1e3"])
+def test_parse_lan_rejects(lan):
+    with pytest.raises(ValueError):
+        parse_lan(Position.from_fen("4k3/1P6/8/8/8/8/8/R3K1N1 w Q - 0 1"),lan)
+
+# checks games are replayed in order, in LAN as well as SAN, and illegal moves are reported
+def test_replay_pgn_files(tmp_path):
+    pgn_path = tmp_path / "games.pgn"
+    pgn_path.write_text(PGN_TEXT + '\n[White "LAN"]\n\n1. e2-e4 e7e5 2. Ng1f3 *\n'
+                        + '\n[White "Broken"]\n\n1. e4 e5 2. Ke3 *\n')
+    results = list(replay_pgn_files([pgn_path],games_per_batch=1,include_moves=True))
+    assert [result["plies"] for result in results] == [10,2,3,2]
+    assert results[2]["moves"] == ["e2e4","e7e5","g1f3"]
+    assert results[3]["error"] == "illegal move: Ke3"
+    assert list(replay_pgn_files([pgn_path],processes=2,games_per_batch=1,include_moves=True)) == results
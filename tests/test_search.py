@@ -0,0 +1,301 @@
+import threading
+
+from src.engine import (Game, Position, SearchStats, TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND,
+                        NULL_WINDOW, SCORE_GRANULARITY, encode_move, decode_move)
+from src.perft import REFERENCE_POSITIONS
+from tests.test_legal_moves import kiwipete_board
+
+
+# checks entries come back as they were stored
+def test_transposition_table_store_and_probe():
+    tt = TranspositionTable(1)
+    tt.new_search()
+    tt.store(12345,3,1.25,EXACT,encode_move(((6,4),(4,4))))
+    tt.store(67890,2,float('-inf'),UPPER_BOUND,encode_move(((1,0),(0,0),'n')))
+    assert tt.probe(12345) == (3,1.25,EXACT,encode_move(((6,4),(4,4))))
+    assert decode_move(tt.probe(67890)[3]) == ((1,0),(0,0),'n')
+    assert tt.probe(11111) is None
+
+# checks a shallow result does not push out a deeper one in the same bucket
+def test_transposition_table_replacement():
+    tt = TranspositionTable(1)
+    tt.new_search()
+    deep_key = 5
+    shallow_key = deep_key + tt.bucket_count # same bucket
+    other_key = deep_key + 2*tt.bucket_count
+    tt.store(deep_key,6,0.5,LOWER_BOUND,None)
+    tt.store(shallow_key,1,-0.5,EXACT,None)
+    assert tt.probe(deep_key) == (6,0.5,LOWER_BOUND,None)
+    assert tt.probe(shallow_key) == (1,-0.5,EXACT,None)
+    # always replace entry takes the newest shallow result
+    tt.store(other_key,1,0.0,EXACT,None)
+    assert tt.probe(deep_key) is not None
+    assert tt.probe(shallow_key) is None
+    assert tt.probe(other_key) == (1,0.0,EXACT,None)
+
+# checks searching with a warm table gives the same result as a cold one
+def test_search_with_transposition_table():
+    game = Game(kiwipete_board)
+    first = game.search_to_depth(game.position,3)
+    assert game.search_to_depth(game.position,3) == first
+    assert Game(kiwipete_board).search_to_depth(game.position,3) == first
+
+# checks iterative deepening stops on its node budget but still returns a legal move
+def test_iterative_deepening_node_limit():
+    game = Game(kiwipete_board)
+    score, move = game.search(game.position,node_limit=20000)
+    assert move in game.position.get_legal_moves()
+    assert game.completed_depth >= 1
+    assert game.nodes < 20000 + 64
+
+# checks iterative deepening to a fixed depth matches a direct search
+def test_iterative_deepening_depth():
+    game = Game(kiwipete_board)
+    score, move = game.search(game.position,max_depth=3)
+    assert score == Game(kiwipete_board).search_to_depth(game.position,3)[0]
+    assert game.completed_depth == 3
+
+# position where white's queen can take a pawn on d5 that is defended by the c6 pawn
+defended_pawn_board = [
+    [None,None,None,None,"k",None,None,None],
+    [None]*8,
+    [None,None,"p",None,None,None,None,None],
+    [None,None,None,"p",None,None,None,None],
+    [None]*8,
+    [None]*8,
+    [None]*8,
+    [None,None,None,"Q","K",None,None,None]
+    ]
+
+# checks quiescence search sees the recapture that a depth 1 search stops before
+def test_quiescence_avoids_horizon_blunder():
+    queen_takes_pawn = ((7,3),(3,3))
+    game = Game()
+    game.position = Position(defended_pawn_board,K_cq=False,K_ck=False,k_cq=False,k_ck=False)
+    game.use_quiescence = False
+    assert game.search_to_depth(game.position,1)[1] == queen_takes_pawn
+    game.use_quiescence = True
+    assert game.search_to_depth(game.position,1)[1] != queen_takes_pawn
+
+# checks the capture generator returns exactly the captures among the legal moves
+def test_capture_moves():
+    position = Game(kiwipete_board).position
+    captures = sorted(position.get_capture_moves())
+    assert len(captures) == 8
+    assert captures == sorted(move for move in position.get_legal_moves() if position.get_piece_at(move[1]))
+
+# checks the transposition table move, captures, killers, countermove and history are ordered in that order
+def test_move_ordering_heuristics():
+    game = Game(kiwipete_board)
+    position = game.position
+    tt_move = ((7,4),(7,5))
+    killer = ((6,0),(5,0))
+    countermove = ((6,1),(5,1))
+    history_move = ((6,6),(5,6))
+    previous_move = ((1,0),(2,0))
+    game.update_move_ordering(encode_move(history_move),3,5,None)
+    game.update_move_ordering(encode_move(countermove),1,4,encode_move(previous_move))
+    game.update_move_ordering(encode_move(killer),1,2,None)
+    ordered = game.order_moves(position,position.get_encoded_moves(),encode_move(tt_move),2,encode_move(previous_move))
+    ordered = [decode_move(move) for move in ordered]
+    assert ordered[0] == tt_move
+    # kiwipete has 8 captures which all come before the quiet moves
+    captures = ordered[1:9]
+    assert all(position.get_piece_at(move[1]) for move in captures)
+    assert ordered[9:12] == [killer,countermove,history_move]
+
+# checks the move picker yields every legal move once, in stages, and only generates the full
+# move list when it gets to the quiet moves
+def test_pick_moves():
+    game = Game(kiwipete_board)
+    position = game.position
+    hash_move = encode_move(((7,4),(7,5)))
+    killer = encode_move(((6,0),(5,0)))
+    game.update_move_ordering(killer,1,2,None)
+    picker = game.pick_moves(position,hash_move,2,None)
+    assert next(picker) == hash_move
+    assert position.legal_moves is None
+    moves = [hash_move] + list(picker)
+    assert sorted(moves) == sorted(position.get_encoded_moves())
+    # of kiwipete's 8 captures, 3 win or trade material and come before the killer, while 5
+    # take defended pawns or knights with more valuable pieces and come last
+    assert all(position.get_piece_at(decode_move(move)[1]) for move in moves[1:4] + moves[-5:])
+    assert moves[4] == killer
+    assert not position.get_piece_at(decode_move(moves[-6])[1])
+
+# checks an en passant capture stored as a killer and countermove is still picked only once
+def test_pick_moves_en_passant_once():
+    game = Game()
+    position = Position.from_fen("rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3")
+    en_passant = encode_move(((3,4),(2,5)))
+    previous_move = encode_move(((1,5),(3,5)))
+    game.update_move_ordering(en_passant,1,2,previous_move)
+    moves = list(game.pick_moves(position,None,2,previous_move))
+    assert len(moves) == len(set(moves))
+    assert sorted(moves) == sorted(position.get_encoded_moves())
+
+# checks scores are whole centipawns, and that a zero window above any such score holds no
+# score but lets the next one up through
+def test_score_granularity():
+    for fen, _ in REFERENCE_POSITIONS.values():
+        position = Position.from_fen(fen)
+        score = position.static_evaluate()
+        assert round(score / SCORE_GRANULARITY) / 100 == score
+    for centipawns in range(-5000, 5000):
+        alpha = centipawns / 100
+        assert alpha < alpha + NULL_WINDOW <= (centipawns + 1) / 100
+
+# checks the selective search techniques save nodes without changing the result here
+def test_selective_search_reduces_nodes():
+    plain = Game()
+    plain.use_pvs = plain.use_null_move = plain.use_lmr = plain.use_aspiration = False
+    plain_result = plain.search(plain.position,max_depth=4)
+    game = Game()
+    assert game.search(game.position,max_depth=4)[0] == plain_result[0]
+    assert game.nodes < plain.nodes
+
+# checks a null move can be taken back and is not tried with only pawns left
+def test_null_move():
+    position = Game(kiwipete_board).position
+    before = (position.zobrist_hash,position.is_whites_move,position.en_passant_target)
+    undo = position.make_null_move()
+    assert position.zobrist_hash == position._compute_hash()
+    position.unmake_null_move(undo)
+    assert (position.zobrist_hash,position.is_whites_move,position.en_passant_target) == before
+    assert position.has_non_pawn_material(True)
+    assert not Position([[None,None,None,None,"k",None,None,None]] + [[None]*8]*5
+                        + [["P"]+[None]*7] + [[None]*4 + ["K"] + [None]*3],
+                        K_cq=False,K_ck=False,k_cq=False,k_ck=False).has_non_pawn_material(True)
+
+# checks two tables on one buffer see each other's entries, and a torn entry is ignored
+def test_shared_transposition_table():
+    buffer = bytearray(1024 * 1024)
+    first, second = TranspositionTable(1,buffer), TranspositionTable(1,buffer)
+    first.store(12345,4,0.5,EXACT,encode_move(((6,4),(4,4))))
+    assert second.probe(12345) == (4,0.5,EXACT,encode_move(((6,4),(4,4))))
+    index = (12345 % second.bucket_count) * 4
+    second.table[index + 1] ^= 1 << 16
+    assert first.probe(12345) is None
+    first.release()
+    second.release()
+
+# checks the parallel search completes the requested depth with a legal move
+def test_smp_search():
+    game = Game()
+    try:
+        score, move = game.smp_search(game.position,max_depth=3,processes=2)
+        assert game.completed_depth == 3
+        assert move in game.position.get_legal_moves()
+        # the same processes search again, and stop when the caller's stop event is set
+        workers = game.search_pool.workers
+        game.stop_event = threading.Event()
+        game.stop_event.set()
+        score, move = game.smp_search(game.position,processes=2)
+        assert game.search_pool.workers is workers
+        assert move in game.position.get_legal_moves()
+    finally:
+        game.close_search_pool()
+    assert not any(worker.is_alive() for worker in workers)
+
+# checks search statistics are collected when a stats object is attached
+def test_search_stats():
+    game = Game(kiwipete_board)
+    game.stats = SearchStats()
+    game.search(game.position,max_depth=3)
+    stats = game.stats
+    assert [iteration[0] for iteration in stats.iterations] == [1,2,3]
+    assert sum(iteration[2] for iteration in stats.iterations) == game.nodes
+    assert sum(stats.nodes_per_ply) + stats.quiescence_nodes == game.nodes
+    assert stats.nodes_per_ply[0] >= 3 # one per iteration plus aspiration re-searches
+    assert 0 < stats.first_move_cutoffs <= stats.beta_cutoffs
+    assert 0 < stats.tt_hits <= stats.tt_probes
+    assert "effective branching factor" in stats.summary()
+
+# checks repetitions are counted for the game and found on the search's hash stack
+def test_repetition():
+    game = Game()
+    shuffle = [((7,6),(5,5)),((0,6),(2,5)),((5,5),(7,6)),((2,5),(0,6))]
+    for move in shuffle * 2:
+        assert not game.is_game_over()
+        game.make_move(*move)
+    assert game.is_game_over()
+
+    game = Game()
+    for move in shuffle + shuffle[:3]:
+        game.make_move(*move)
+    game.search(game.position,max_depth=2)
+    assert game.hash_stack == game.repeatable_positions
+    position = game.position.get_position_copy()
+    position.make_move(*shuffle[3])
+    assert game.is_threefold_repetition(position)
+    game.hash_stack.pop(0)
+    assert not game.is_threefold_repetition(position)
+
+# starts a ponder search on a thread, returns the thread and an event that is set once the
+# search has completed depth plies
+def start_pondering(game,move,depth,time_limit=None):
+    reached = threading.Event()
+    def info(completed_depth,*_):
+        if completed_depth >= depth:
+            reached.set()
+    game.info_callback = info
+    game.pondering = True
+    game.stop_event = threading.Event()
+    thread = threading.Thread(target=game.ponder,args=(game.position,move),kwargs={"time_limit":time_limit})
+    thread.start()
+    return thread, reached
+
+# checks a ponder search ignores its time limit until the expected move is played, and a
+# cancelled one leaves its results in the transposition table
+def test_ponder():
+    game = Game()
+    reply = ((6,4),(4,4))
+    # the time limit would stop a normal search after its first iteration
+    thread, reached = start_pondering(game,reply,3,time_limit=0.001)
+    assert reached.wait(30)
+    assert thread.is_alive()
+    game.ponder_hit()
+    thread.join(30)
+    assert not thread.is_alive() and game.completed_depth >= 3
+
+    game = Game()
+    thread, reached = start_pondering(game,reply,2)
+    assert reached.wait(30)
+    game.stop_event.set()
+    thread.join(30)
+    assert not thread.is_alive() and not game.pondering
+    position, _ = game.position.after_move(*reply)
+    assert game.tt.probe(position.zobrist_hash) is not None
+    assert game.get_ponder_move(position) in position.get_legal_moves()
+
+    # pondering inside a shuffle still sees the game's earlier positions repeat
+    game = Game()
+    shuffle = [((7,6),(5,5)),((0,6),(2,5)),((5,5),(7,6)),((2,5),(0,6))]
+    for move in shuffle + shuffle[:2]:
+        game.make_move(*move)
+    game.ponder(game.position,shuffle[2],max_depth=2)
+    position, _ = game.position.after_move(*shuffle[2])
+    assert game.hash_stack == game.repeatable_positions + [position.zobrist_hash]
+    position.make_move(*shuffle[3])
+    assert game.is_threefold_repetition(position)
+
+# checks the parallel search starts from and keeps the game's transposition table
+def test_smp_search_keeps_table():
+    game = Game()
+    try:
+        game.smp_search(game.position,max_depth=2,processes=2)
+    finally:
+        game.close_search_pool()
+    assert game.tt.probe(game.position.zobrist_hash)[0] >= 2
+
+# checks the table generation moves on once per search, not once per iteration
+def test_search_generation():
+    game = Game()
+    game.search(game.position,max_depth=4)
+    assert game.tt.generation == 1
+    try:
+        game.smp_search(game.position,max_depth=2,processes=2)
+    finally:
+        game.close_search_pool()
+    assert game.tt.generation == 2
+    assert game.tt.probe(game.position.zobrist_hash)[0] >= 2
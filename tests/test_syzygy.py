@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from src.engine import Game, Position, SearchStats, TABLEBASE_WIN_SCORE
+
+
+# stands in for a SyzygyTablebase, every 3 piece position is a win for white and the root
+# move is fixed
+class FakeTablebase:
+    max_pieces = 3
+
+    def __init__(self):
+        self.probed_positions = []
+
+    def probe_wdl(self,position):
+        self.probed_positions.append(position.to_fen())
+        return 2 if position.is_whites_move else -2
+
+    def probe_root(self,position):
+        return 2, ((7,0),(6,0))
+
+
+# checks the root move comes from the tablebase and only small positions are probed in search
+def test_tablebase_in_search():
+    game = Game()
+    game.tablebase = FakeTablebase()
+    game.set_position(Position.from_fen("8/8/8/4k3/8/8/8/KQ6 w - - 0 1"))
+    assert game.search(game.position,max_depth=3) == (TABLEBASE_WIN_SCORE,((7,0),(6,0)))
+
+    # white can take the knight, leaving 3 pieces that the tablebase scores as won
+    game.set_position(Position.from_fen("8/8/8/4k3/8/8/2n5/KQ6 w - - 0 1"))
+    game.stats = SearchStats()
+    assert game.search_to_depth(game.position,2) == (TABLEBASE_WIN_SCORE,((7,1),(6,2)))
+    assert game.stats.tablebase_hits > 0
+    assert all(fen.startswith("8/8/8/4k3/8/8/2Q5/K7") for fen in game.tablebase.probed_positions)
+
+
+# checks real tables when python-chess is installed and SYZYGY_PATH points at 3-4 piece tables
+def test_syzygy_tablebase():
+    pytest.importorskip("chess")
+    if not os.environ.get("SYZYGY_PATH"):
+        pytest.skip("SYZYGY_PATH is not set")
+    from src.syzygy import SyzygyTablebase
+    with SyzygyTablebase(os.environ["SYZYGY_PATH"]) as tablebase:
+        assert tablebase.max_pieces >= 3
+        position = Position.from_fen("8/8/8/4k3/8/8/8/KQ6 w - - 0 1")
+        assert tablebase.probe_wdl(position) == 2
+        assert tablebase.probe_wdl(Position.from_fen("8/8/8/4k3/8/8/8/KN6 w - - 0 1")) == 0
+        game = Game()
+        game.tablebase = tablebase
+        game.set_position(position)
+        while not game.is_game_over():
+            game.make_move(*game.search(game.position,max_depth=1)[1])
+        assert game.position.get_legal_moves() == [] and game.position._is_in_check(False)
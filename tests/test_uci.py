@@ -0,0 +1,62 @@
+import io
+import time
+
+from src.engine import Position, move_to_uci, uci_to_move
+from src.uci import UCIEngine
+from tests.test_legal_moves import kiwipete_board
+
+
+# checks FEN parsing and UCI move notation
+def test_from_fen_and_uci_moves():
+    position = Position.from_fen("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+    assert position.board == kiwipete_board
+    assert position.zobrist_hash == Position(kiwipete_board).zobrist_hash
+    assert position.to_fen() == "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+    position.make_move((6,0),(4,0))
+    assert position.to_fen(2) == "r3k2r/p1ppqpb1/bn2pnp1/3PN3/Pp2P3/2N2Q1p/1PPBBPPP/R3K2R b KQkq a3 0 2"
+    assert uci_to_move("e1g1") == ((7,4),(7,6))
+    assert uci_to_move("b2a1n") == ((6,1),(7,0),'n')
+    assert move_to_uci(((1,4),(0,4),'q')) == "e7e8q"
+
+# checks position and go commands give a legal best move
+def test_position_and_go():
+    output = io.StringIO()
+    engine = UCIEngine(output)
+    engine.handle_command("position startpos moves e2e4 e7e5 g1f3")
+    assert not engine.game.position.is_whites_move
+    engine.handle_command("go depth 2")
+    engine.search_thread.join()
+    lines = output.getvalue().splitlines()
+    assert lines[0].startswith("info depth 1 score cp")
+    assert lines[-1].startswith("bestmove ")
+    assert uci_to_move(lines[-1].split()[1]) in engine.game.position.get_legal_moves()
+
+# checks isready is answered during an infinite search, which only ends on stop
+def test_infinite_search_stops():
+    output = io.StringIO()
+    engine = UCIEngine(output)
+    engine.handle_command("position startpos")
+    engine.handle_command("go infinite")
+    engine.handle_command("isready")
+    assert "readyok" in output.getvalue()
+    time.sleep(0.2)
+    assert "bestmove" not in output.getvalue()
+    engine.handle_command("stop")
+    assert output.getvalue().splitlines()[-1].startswith("bestmove ")
+
+# checks go runs the parallel search when the Threads option is more than one
+def test_threads_option():
+    output = io.StringIO()
+    engine = UCIEngine(output)
+    engine.handle_command("uci")
+    assert "option name Threads type spin default 1 min 1 max 64" in output.getvalue()
+    engine.handle_command("setoption name Threads value 2")
+    engine.handle_command("position startpos moves e2e4")
+    engine.handle_command("go depth 2")
+    engine.search_thread.join()
+    assert engine.game.search_pool is not None and engine.game.search_pool.processes == 2
+    lines = output.getvalue().splitlines()
+    assert lines[-1].startswith("bestmove ")
+    assert uci_to_move(lines[-1].split()[1]) in engine.game.position.get_legal_moves()
+    engine.handle_command("quit")
+    assert engine.game.search_pool is None